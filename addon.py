@@ -6,16 +6,31 @@ import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'resources', 'lib'))
 
 from okino.plugin import plugin
-from okino.common import LocalizedError, notify, lang
+from okino.common import LocalizedError, notify, lang, log, trace_spans, profiling, push_metrics
+from util.importtimer import ImportTimer
 from xbmcswift2 import xbmcgui
 
+# View modules are imported only when a path with one of the first segments is dispatched
+VIEW_MODULES = [
+    ('okino.plugin.main', ['', 'play', 'files', 'folders', 'explore', 'genre', 'bookmarks', 'history', 'library',
+                           'update_library']),
+    ('okino.plugin.contextmenu', ['mark', 'refresh', 'turn_on_auto_refresh', 'turn_off_auto_refresh', 'bookmarks',
+                                  'library', 'download']),
+    ('okino.plugin.search', ['search']),
+    ('okino.plugin.advancedsearch', ['advanced_search']),
+]
+
+for _module_name, _prefixes in VIEW_MODULES:
+    plugin.add_lazy_module(_module_name, _prefixes)
+
 if __name__ == '__main__':
     try:
-        import okino.plugin.main
-        import okino.plugin.contextmenu
-        import okino.plugin.search
-        import okino.plugin.advancedsearch
-        plugin.run()
+        with trace_spans(), profiling('plugin'):
+            if plugin.get_setting('import-report', bool):
+                with ImportTimer(logger=log):
+                    plugin.run()
+            else:
+                plugin.run()
     except LocalizedError as e:
         e.log()
         if e.kwargs.get('dialog'):
@@ -24,3 +39,5 @@ if __name__ == '__main__':
             notify(e.localized)
         if e.kwargs.get('check_settings'):
             plugin.open_settings()
+    finally:
+        push_metrics()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of player event dispatch: Callbacks with prebound invokers against the former dispatch,
+which inspected every callback on every event.
+
+Run from the addon root:
+
+    PYTHONPATH=resources/lib python -m okino.bench.callbacks [events]
+"""
+
+import sys
+import inspect
+import timeit
+
+from okino.player import AbstractPlayer
+from util.callbacks import Callbacks
+
+
+class LegacyCallbacks(Callbacks):
+    """
+    Callbacks dispatching the way they used to (with kwargs/args filtering fixed per callback)
+    """
+    def run_callbacks(self, event, *args, **kwargs):
+        if event != "*":
+            self.run_callbacks("*", *args, **kwargs)
+            self.log.debug("Event '%s' occurred.", event)
+        if event in self.callbacks:
+            for callback in self.callbacks[event]:
+                self.log.debug("Running callback %s for event '%s'", callback, event)
+                argspec = inspect.getargspec(callback)
+                specargs = argspec.args
+                if hasattr(callback, 'im_self') and callback.im_self is not None:
+                    specargs = specargs[1:]
+                kw = dict(kwargs, event=event)
+                kw = dict(filter(lambda v: v[0] in specargs, kw.iteritems()))
+                callback(*args[:len(specargs)], **kw)
+
+
+class Listener(object):
+    """
+    Callbacks like the ones attached during playback (progress dialogs, engines, prefetcher)
+    """
+    def __init__(self):
+        self.calls = 0
+
+    def on_event(self):
+        self.calls += 1
+
+    def on_seek(self, time, offset):
+        self.calls += 1
+
+    def on_started(self, duration=None, event=None):
+        self.calls += 1
+
+
+def make_callbacks(cls):
+    callbacks = cls()
+    listeners = [Listener() for _ in range(3)]
+    for listener in listeners:
+        callbacks.attach([AbstractPlayer.PLAYBACK_PAUSED, AbstractPlayer.PLAYBACK_RESUMED], listener.on_event)
+        callbacks.attach(AbstractPlayer.PLAYBACK_SEEK, listener.on_seek)
+        callbacks.attach(AbstractPlayer.PLAYBACK_STARTED, listener.on_started)
+    return callbacks, listeners
+
+
+def dispatch(callbacks, events):
+    for i in xrange(events):
+        callbacks.run_callbacks(AbstractPlayer.PLAYBACK_SEEK, 1000, 10)
+        callbacks.run_callbacks(AbstractPlayer.PLAYBACK_PAUSED)
+        callbacks.run_callbacks(AbstractPlayer.PLAYBACK_STARTED, duration=3600)
+        callbacks.run_callbacks(AbstractPlayer.QUEUE_NEXT_ITEM)
+
+
+def measure(events=10000):
+    """
+    :return: dict {'legacy'|'prebound': events per second}
+    """
+    res = {}
+    for name, cls in (('legacy', LegacyCallbacks), ('prebound', Callbacks)):
+        callbacks, listeners = make_callbacks(cls)
+        seconds = min(timeit.repeat(lambda: dispatch(callbacks, events), repeat=3, number=1))
+        assert sum(l.calls for l in listeners) == 3 * 3 * events * 3
+        res[name] = 4 * events / seconds
+    return res
+
+
+def main(args=None):
+    args = args if args is not None else sys.argv[1:]
+    events = int(args[0]) if args else 10000
+    res = measure(events)
+    print "%-10s %14s" % ("", "events/s")
+    for name in ('legacy', 'prebound'):
+        print "%-10s %14.0f" % (name, res[name])
+    print "%-10s %13.1fx" % ("speedup", res['prebound'] / res['legacy'])
+
+
+if __name__ == '__main__':
+    main()
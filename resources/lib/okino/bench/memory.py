@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Memory benchmark of scraper records: compares compact (tuples, int stream dimensions) folders of a long series
+with the structures the scraper used to produce (lists, string dimensions).
+
+Run from the addon root:
+
+    PYTHONPATH=resources/lib python -m okino.bench.memory [episodes]
+"""
+
+import sys
+import datetime
+import cPickle
+
+from okino.enumerations import Flag, Format, Language, VideoQuality, AudioQuality
+from okino.scraper import Folder, File, Quality, VideoStreamInfo, AudioStreamInfo
+
+
+def deep_size(obj, seen=None):
+    """
+    Size of the object with everything it references, shared objects (interned strings, enum members) counted once
+    """
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.iteritems())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(i, seen) for i in obj)
+    return size
+
+
+def make_series(episodes, compact=True):
+    """
+    Build a folder of a series with given number of episodes, the same way scraper does
+
+    :rtype : Folder
+    """
+    seq = tuple if compact else list
+    dim = int if compact else str
+    files = []
+    for i in xrange(episodes):
+        video = [VideoStreamInfo(dim("1280"), dim("720"), u"AVC", 2500.0 + i)]
+        audio = [AudioStreamInfo(Language.RUSSIAN, u"AC3", 384.0, 6),
+                 AudioStreamInfo(Language.ENGLISH, u"AC3", 384.0, 6)]
+        files.append(File(str(100000 + i), 1000, 5000, u"Серия %d" % (i + 1), None,
+                          "http://okino.ru/download/torrent?file=%d" % (100000 + i), u"MKV",
+                          seq([Language.RUSSIAN, Language.ENGLISH]), 2700 + i, 1400000000L + i,
+                          seq(video), seq(audio)))
+    return Folder(5000, 1000, u"Сезон 1", Flag.NEW_SERIES, "http://okino.ru/film/content/1000?fid=5000",
+                  Quality(Format.HD720, VideoQuality.HD_RIP, AudioQuality.PROFESSIONAL),
+                  seq([Language.RUSSIAN, Language.ENGLISH]), Format.HD720, seq([Language.RUSSIAN]), seq(),
+                  2700 * episodes, 1400000000L * episodes, seq(files))
+
+
+def measure(episodes=500):
+    """
+    :return: dict {'legacy'|'compact': (deep size, pickled size)}
+    """
+    res = {}
+    for name, compact in (('legacy', False), ('compact', True)):
+        folder = make_series(episodes, compact)
+        res[name] = (deep_size(folder), len(cPickle.dumps([folder], cPickle.HIGHEST_PROTOCOL)))
+    return res
+
+
+def main(args=None):
+    args = args if args is not None else sys.argv[1:]
+    episodes = int(args[0]) if args else 500
+    res = measure(episodes)
+    print "Series folder with %d episodes (%s)" % (episodes, datetime.datetime.now().strftime('%Y-%m-%d %H:%M'))
+    print "%-10s %12s %12s" % ("", "memory, b", "pickle, b")
+    for name in ('legacy', 'compact'):
+        print "%-10s %12d %12d" % ((name,) + res[name])
+    legacy, compact = res['legacy'], res['compact']
+    print "%-10s %11.1f%% %11.1f%%" % ("saved", 100.0 * (legacy[0] - compact[0]) / legacy[0],
+                                       100.0 * (legacy[1] - compact[1]) / legacy[1])
+
+
+if __name__ == '__main__':
+    main()
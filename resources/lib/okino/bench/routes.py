@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Setup of end-to-end route benchmarks (xbmcswift2 "run bench" mode, see routes.json): serves recorded pages
+(see okino.bench.scraper for fixture names) from a local HTTP server and points the scraper to it.
+
+Run from the addon root:
+
+    PYTHONPATH=resources/lib xbmcswift2 run bench resources/lib/okino/bench/routes.json [--cold] [-n rounds]
+
+Fixtures are taken from the "fixtures" directory next to the script or from OKINO_BENCH_FIXTURES.
+"""
+
+import os
+import threading
+import BaseHTTPServer
+
+from okino.bench.scraper import FixtureHttpClient, fixture_name
+from okino.scraper import OkinoScraper
+
+
+class FixtureRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler, object):
+    pages = None
+
+    def do_GET(self):
+        try:
+            body = self.pages.page(fixture_name(self.path))
+        except IOError:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_fixtures(path, port=0):
+    """
+    Start fixture HTTP server in a daemon thread
+
+    :return: base URL of the server
+    """
+    handler = type('Handler', (FixtureRequestHandler,), {'pages': FixtureHttpClient(path)})
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', port), handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return "http://127.0.0.1:%d" % server.server_address[1]
+
+
+def setup(script_dir):
+    path = os.environ.get('OKINO_BENCH_FIXTURES', os.path.join(script_dir, 'fixtures'))
+    OkinoScraper.base_url = serve_fixtures(path)
+
+
+def reset():
+    """
+    Drop container singletons (the scraper with its caches etc.), so cold runs start from scratch
+    """
+    import okino.container as container
+    for func in vars(container).values():
+        if hasattr(func, 'reset'):
+            func.reset()
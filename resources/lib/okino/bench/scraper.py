@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Offline benchmark of OkinoScraper parsing: replays recorded okino.ru pages through a stub HTTP client.
+
+Fixtures are HTML files in a directory, named after the page URL (see fixture_name):
+
+    films_results.html, films_results_skip_15.html  - /films/results[?skip=15]
+    film_details_<id>.html                          - /film/details/<id>
+    film_content_<id>.html                          - /film/content/<id>
+    film_filelist_<id>_fid_<fid>.html               - /film/filelist/<id>?fid=<fid>
+
+A small set of pages in the site's markup (a movie with a single folder and a series with two folders) and
+its baseline are kept in okino/bench/fixtures; record real pages with --record for more representative runs.
+
+Run from the addon root:
+
+    PYTHONPATH=resources/lib python -m okino.bench.scraper <fixtures dir> [--rounds N] [--save-baseline]
+    PYTHONPATH=resources/lib python -m okino.bench.scraper <fixtures dir> --record <url> [<url> ...]
+
+Results are compared with baseline.json in the fixtures directory: speed ratio and whether parsed records
+(their repr) are identical.
+"""
+
+import gc
+import os
+import re
+import sys
+import json
+import glob
+import hashlib
+import logging
+import resource
+import urlparse
+
+from okino.scraper import OkinoScraper
+from okino.searchfilter import OkinoSearchFilter
+from util.htmldocument import HtmlDocument
+from util.httpclient import HttpClient, HttpRequest, HttpResponse
+from util.timer import Timer
+
+
+def fixture_name(url):
+    """
+    Fixture file name (without extension) for the page URL
+    """
+    parts = urlparse.urlparse(url)
+    query = urlparse.parse_qs(parts.query)
+    name = parts.path.strip('/').replace('/', '_')
+    if parts.path == '/films/results':
+        # search state blob isn't part of the name, results pages differ by skip only
+        query = dict((k, v) for k, v in query.iteritems() if k == 'skip')
+    for key in sorted(query):
+        name += '_%s_%s' % (key, query[key][0])
+    return re.sub(r'[^\w]', '_', name)
+
+
+class FixtureHttpClient(HttpClient):
+    """
+    HttpClient serving pages from fixtures directory
+    """
+    def __init__(self, path, log=None):
+        HttpClient.__init__(self, log)
+        self.path = path
+        self._pages = {}
+
+    def page(self, name):
+        if name not in self._pages:
+            with open(os.path.join(self.path, name + '.html'), 'rb') as f:
+                self._pages[name] = f.read()
+        return self._pages[name]
+
+    def fetch(self, request, **request_params):
+        if not isinstance(request, HttpRequest):
+            request = HttpRequest(request)
+        response = HttpResponse(request)
+        response.body = self.page(fixture_name(request.url))
+        return response
+
+
+class RecordingHttpClient(HttpClient):
+    """
+    HttpClient saving fetched pages as fixtures
+    """
+    def __init__(self, path, log=None):
+        HttpClient.__init__(self, log)
+        self.path = path
+
+    def fetch(self, request, **request_params):
+        response = HttpClient.fetch(self, request, **request_params)
+        with open(os.path.join(self.path, fixture_name(response.request.url) + '.html'), 'wb') as f:
+            f.write(response.body)
+        return response
+
+
+def _fixtures(path, pattern):
+    res = []
+    for filename in sorted(glob.glob(os.path.join(path, pattern + '.html'))):
+        name = os.path.splitext(os.path.basename(filename))[0]
+        res.append((name, [int(n) for n in re.findall(r'\d+', name)]))
+    return res
+
+
+def _max_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class ScraperBenchmark:
+    """
+    Times each parsing stage over all fixtures of its kind
+    """
+    def __init__(self, path, rounds=5, log=None):
+        self.path = path
+        self.rounds = rounds
+        self.log = log or logging.getLogger(__name__)
+        self.http_client = FixtureHttpClient(path)
+        # scraper logs every page at INFO, keep it quiet
+        scraper_log = logging.getLogger('okino.bench.scraper.quiet')
+        scraper_log.setLevel(logging.WARNING)
+        self.scraper = OkinoScraper(log=scraper_log, http_client=self.http_client)
+
+    def stages(self):
+        scraper = self.scraper
+        search_filter = OkinoSearchFilter()
+
+        def parse_files(name, media_id, folder_id):
+            html = self.http_client.page(name)
+            doc = HtmlDocument.from_string(html).find('table', {'id': 'files_tbl'})
+            return scraper._parse_files(doc, media_id, folder_id)
+
+        return [
+            ('search', _fixtures(self.path, 'films_results*'),
+             lambda name, nums: scraper.search(search_filter, nums[0] if nums else None)),
+            ('_parse_details', _fixtures(self.path, 'film_details_*'),
+             lambda name, nums: scraper._parse_details(self.http_client.page(name), nums[0])),
+            ('get_folders', _fixtures(self.path, 'film_content_*'),
+             lambda name, nums: scraper.get_folders(nums[0])),
+            ('_parse_files', _fixtures(self.path, 'film_filelist_*'),
+             lambda name, nums: parse_files(name, nums[0], nums[1])),
+        ]
+
+    def run_stage(self, fixtures, func):
+        """
+        :return: dict with timing, memory and output digest of the stage
+        """
+        for name, nums in fixtures:
+            # warm up page reads
+            self.http_client.page(name)
+        digest = hashlib.md5()
+        gc.collect()
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        objects = len(gc.get_objects())
+        rss = _max_rss()
+        try:
+            with Timer() as timer:
+                for i in xrange(self.rounds):
+                    for name, nums in fixtures:
+                        res = func(name, nums)
+                        if not i:
+                            digest.update(repr(res))
+        finally:
+            allocated = len(gc.get_objects()) - objects
+            if gc_enabled:
+                gc.enable()
+        pages = len(fixtures) * self.rounds
+        return {
+            'pages': pages,
+            'seconds': timer.interval,
+            'pages_per_sec': pages / timer.interval if timer.interval else 0,
+            'peak_rss_kb': _max_rss() - rss,
+            'gc_objects': allocated,
+            'digest': digest.hexdigest(),
+        }
+
+    def run(self):
+        results = {}
+        for stage, fixtures, func in self.stages():
+            if not fixtures:
+                self.log.warn("No fixtures for %s, skipping", stage)
+                continue
+            results[stage] = self.run_stage(fixtures, func)
+        return results
+
+    @property
+    def baseline_path(self):
+        return os.path.join(self.path, 'baseline.json')
+
+    def load_baseline(self):
+        if not os.path.exists(self.baseline_path):
+            return {}
+        with open(self.baseline_path) as f:
+            return json.load(f)
+
+    def save_baseline(self, results):
+        with open(self.baseline_path, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    @staticmethod
+    def report(results, baseline):
+        lines = ["%-15s %6s %10s %10s %12s %10s  %s" % ("stage", "pages", "seconds", "pages/s", "peak rss, kb",
+                                                       "objects", "vs baseline")]
+        for stage in sorted(results):
+            r = results[stage]
+            base = baseline.get(stage)
+            if base:
+                cmp_str = "%.2fx speed, output %s" % (r['pages_per_sec'] / base['pages_per_sec'],
+                                                      "identical" if base['digest'] == r['digest'] else "CHANGED")
+            else:
+                cmp_str = "-"
+            lines.append("%-15s %6d %10.3f %10.1f %12d %10d  %s" % (stage, r['pages'], r['seconds'],
+                                                                   r['pages_per_sec'], r['peak_rss_kb'],
+                                                                   r['gc_objects'], cmp_str))
+        return "\n".join(lines)
+
+
+def main(args=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Offline OkinoScraper parsing benchmark")
+    parser.add_argument('fixtures', help="Directory with recorded pages")
+    parser.add_argument('--rounds', type=int, default=5, help="Parse every fixture this many times")
+    parser.add_argument('--save-baseline', action='store_true', help="Store results as the new baseline")
+    parser.add_argument('--record', nargs='+', metavar='URL', help="Fetch pages from the site into fixtures")
+    args = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.record:
+        client = RecordingHttpClient(args.fixtures)
+        for url in args.record:
+            client.fetch(url)
+        return
+
+    bench = ScraperBenchmark(args.fixtures, args.rounds)
+    results = bench.run()
+    print bench.report(results, bench.load_baseline())
+    if args.save_baseline:
+        bench.save_baseline(results)
+
+
+if __name__ == '__main__':
+    main()
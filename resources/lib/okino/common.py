@@ -6,12 +6,13 @@ import sys
 import shutil
 import logging
 import threading
+import urlparse
 
 from util.causedexception import CausedException
 from util.enum import Enum
 from util.ordereddict import OrderedDict
 from xbmcswift2 import CLI_MODE, xbmc, xbmcvfs, xbmcgui, direxists, ensure_unicode, ensure_fs_encoding
-from contextlib import closing
+from contextlib import closing, contextmanager
 from plugin import plugin
 
 
@@ -73,7 +74,22 @@ def temp_path():
     return path
 
 
+def local_path(path):
+    """
+    Return local file system path for the (possibly special://) path, or None for network paths
+    """
+    if path.startswith("special://"):
+        path = xbmc.translatePath(path)
+    return None if "://" in path else ensure_unicode(path)
+
+
 class FileCopyingThread(threading.Thread):
+    """
+    Copies single file: local files are renamed (if possible) or copied by chunks counting copied bytes,
+    network paths are copied with xbmcvfs.copy
+    """
+    COPY_BUFFER_SIZE = 1024 * 1024
+
     def __init__(self, src, dst, delete=False):
         super(FileCopyingThread, self).__init__()
         self.src = src
@@ -81,18 +97,29 @@ class FileCopyingThread(threading.Thread):
         self.delete = delete
         self.tmp = self.dst + ".part"
         self.copied = False
+        self.copied_bytes = 0
         self.src_size = file_size(self.src)
+        self.local_src = local_path(src)
+        self.local_dst = local_path(dst)
+
+    @property
+    def is_local(self):
+        return self.local_src is not None and self.local_dst is not None
 
     def run(self):
         if xbmcvfs.exists(self.dst):
             xbmcvfs.delete(self.dst)
         xbmcvfs.mkdirs(os.path.dirname(self.dst))
-        log.info("Copying %s to %s...", self.src, self.dst)
-        xbmcvfs.delete(self.tmp)
-        if xbmcvfs.copy(self.src, self.tmp):
+        if self.is_local:
+            if self.delete and self._move():
+                return
+            success = self._copy_local()
+        else:
+            success = self._copy_vfs()
+        if success:
             log.info("Success.")
             self.copied = True
-            if xbmcvfs.rename(self.tmp, self.dst):
+            if self._rename(self.tmp, self.dst):
                 if self.delete and xbmcvfs.delete(self.src):
                     log.info("File %s deleted.", self.src)
             else:
@@ -101,32 +128,111 @@ class FileCopyingThread(threading.Thread):
         else:
             log.info("Failed")
 
+    def _rename(self, src, dst):
+        if not self.is_local:
+            return xbmcvfs.rename(src, dst)
+        try:
+            os.rename(ensure_fs_encoding(local_path(src)), ensure_fs_encoding(local_path(dst)))
+            return True
+        except OSError as e:
+            log.info("Renaming %s to %s failed (%s).", src, dst, e)
+            return False
+
+    def _move(self):
+        if not self._rename(self.src, self.dst):
+            return False
+        log.info("Moved %s to %s.", self.src, self.dst)
+        self.copied = True
+        self.copied_bytes = self.src_size
+        return True
+
+    def _copy_local(self):
+        log.info("Copying %s to %s...", self.src, self.dst)
+        try:
+            with open(ensure_fs_encoding(self.local_src), 'rb') as src_fd:
+                with open(ensure_fs_encoding(self.local_dst + ".part"), 'wb') as dst_fd:
+                    while True:
+                        buf = src_fd.read(self.COPY_BUFFER_SIZE)
+                        if not buf:
+                            break
+                        dst_fd.write(buf)
+                        self.copied_bytes += len(buf)
+        except (IOError, OSError) as e:
+            log.info("Copying failed: %s", e)
+            xbmcvfs.delete(self.tmp)
+            return False
+        return True
+
+    def _copy_vfs(self):
+        log.info("Copying %s to %s...", self.src, self.dst)
+        xbmcvfs.delete(self.tmp)
+        return xbmcvfs.copy(self.src, self.tmp)
+
+    def transferred(self):
+        if self.copied:
+            return self.src_size
+        elif self.is_local:
+            return self.copied_bytes
+        else:
+            return xbmcvfs.exists(self.tmp) and file_size(self.tmp) or 0
+
     def progress(self):
         if self.copied:
             return 100
-        else:
-            cur_size = xbmcvfs.exists(self.tmp) and file_size(self.tmp) or 0
-            return self.src_size and cur_size*100/self.src_size or 0
+        return self.src_size and self.transferred()*100/self.src_size or 0
 
 
 class FileCopyThread(threading.Thread):
+    """
+    Copies files one by one per destination device, copying to different devices in parallel
+    """
+    MAX_PARALLEL_DEVICES = 2
+
     def __init__(self, files, delete=False, on_finish=None):
         super(FileCopyThread, self).__init__()
         self.files = files
         self.delete = delete
         self.on_finish = on_finish
 
+    @staticmethod
+    def _device(path):
+        local = local_path(path)
+        if local is None:
+            return urlparse.urlparse(path).netloc
+        path = ensure_fs_encoding(local)
+        while not os.path.exists(path) and os.path.dirname(path) != path:
+            path = os.path.dirname(path)
+        return os.stat(path).st_dev
+
     def run(self):
         progress = xbmcgui.DialogProgressBG()
         with closing(progress):
             progress.create(lang(40319))
+            groups = OrderedDict()
             for src, dst in self.files.iteritems():
-                progress.update(0, message=src)
-                copying_thread = FileCopyingThread(src, dst, self.delete)
-                copying_thread.start()
-                while copying_thread.is_alive():
+                groups.setdefault(self._device(dst), []).append((src, dst))
+            pending = groups.values()
+            active = []
+            total_size = sum(file_size(src) for src in self.files) or 1
+            copied_size = 0
+            while pending or active:
+                for thread, rest in list(active):
+                    if not thread.is_alive():
+                        copied_size += thread.src_size
+                        active.remove((thread, rest))
+                        if rest:
+                            pending.insert(0, rest)
+                while pending and len(active) < self.MAX_PARALLEL_DEVICES:
+                    rest = pending.pop(0)
+                    src, dst = rest.pop(0)
+                    thread = FileCopyingThread(src, dst, self.delete)
+                    thread.start()
+                    active.append((thread, rest))
+                if active:
+                    transferred = copied_size + sum(t.transferred() for t, _ in active)
+                    progress.update(transferred*100/total_size,
+                                    message=", ".join(os.path.basename(t.src) for t, _ in active))
                     sleep(250)
-                    progress.update(copying_thread.progress())
             if self.on_finish:
                 self.on_finish()
 
@@ -184,40 +290,174 @@ def file_size(path):
     return xbmcvfs.Stat(path).st_size()
 
 
-def dirwalk(top, topdown=True):
-    dirs, nondirs = xbmcvfs.listdir(top)
+class TempSpaceManager(object):
+    """
+    Keeps temporary folder under quota evicting least recently played top-level entries first.
 
-    if topdown:
-        yield top, dirs, nondirs
-    for name in dirs:
-        new_path = os.path.join(top, name)
-        for x in dirwalk(new_path, topdown):
-            yield x
-    if not topdown:
-        yield top, dirs, nondirs
+    Sizes and access times of the entries are kept in the index, so only touched or new entries are measured.
+    """
+    def __init__(self, path, index, max_size, log=None):
+        """
+        :type index: dict
+        :param max_size: Quota in bytes
+        """
+        self.path = path
+        self.index = index
+        self.max_size = max_size
+        self.log = log or logging.getLogger(__name__)
+
+    def _entry(self, path):
+        rel = os.path.relpath(ensure_unicode(path), self.path)
+        if rel == os.curdir or rel.startswith(os.pardir):
+            return None
+        return rel.split(os.sep, 1)[0]
+
+    def _measure(self, name):
+        path = ensure_fs_encoding(os.path.join(self.path, name))
+        size = 0
+        try:
+            if not os.path.isdir(path):
+                return os.path.getsize(path)
+            for top, dirs, files in os.walk(path):
+                for f in files:
+                    size += os.path.getsize(os.path.join(top, f))
+        except OSError:
+            pass
+        return size
+
+    def _remove(self, name):
+        path = ensure_fs_encoding(os.path.join(self.path, name))
+        self.log.info("Evicting from temporary folder: %s", name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def touch(self, paths):
+        """
+        Mark entries containing given paths as just used and re-measure them
+        """
+        now = time.time()
+        for name in set(filter(None, (self._entry(p) for p in paths))):
+            self.index[name] = (self._measure(name), now)
+
+    def sync(self):
+        """
+        Drop vanished entries from the index and measure the unknown ones (they are considered least recent)
+        """
+        names = set(ensure_unicode(n) for n in os.listdir(ensure_fs_encoding(self.path)))
+        for name in self.index.keys():
+            if name not in names:
+                del self.index[name]
+        for name in names.difference(self.index.keys()):
+            self.index[name] = (self._measure(name), 0)
+
+    def size(self):
+        return sum(size for size, _ in self.index.values())
+
+    def purge(self):
+        self.sync()
+        temp_size = self.size()
+        self.log.info("Current temporary folder size / Max size: %d / %d", temp_size, self.max_size)
+        if temp_size <= self.max_size:
+            return
+        self.log.info("Purging temporary folder...")
+        for name, (size, _) in sorted(self.index.items(), key=lambda i: i[1][1]):
+            if temp_size <= self.max_size:
+                break
+            self._remove(name)
+            del self.index[name]
+            temp_size -= size
+        self.log.info("New temporary folder size: %d", temp_size)
 
 
-def get_dir_size(directory):
-    dir_size = 0
-    for (path, dirs, files) in dirwalk(directory):
-        for f in files:
-            filename = os.path.join(path, f)
-            dir_size += file_size(filename)
-    return dir_size
+def purge_temp_dir():
+    import okino.container as container
+    temp_space = container.temp_space()
+    temp_space.purge()
+    temp_space.index.sync()
 
 
-def purge_temp_dir():
-    path = temp_path()
-    temp_size = get_dir_size(path)
-    max_size = plugin.get_setting('temp-max-size', int)*1024*1024*1024
-    log.info("Current temporary folder size / Max size: %d / %d", temp_size, max_size)
-    if temp_size > max_size:
-        log.info("Purging temporary folder...")
-        shutil.rmtree(path, True)
-        if not direxists(path):
-            # noinspection PyBroadException
-            if xbmcvfs.mkdirs(path):
-                log.info("New temporary folder size: %d", get_dir_size(path))
+# Methods recorded as spans when tracing is enabled, besides scraper spans
+TRACED_METHODS = [
+    ('xbmcswift2.plugin', 'Plugin', '_dispatch', 'plugin'),
+    ('xbmcswift2.xbmcmixin', 'XBMCMixin', 'add_items', 'plugin'),
+    ('xbmcswift2.storage', 'Storage', '_execute', 'storage'),
+]
+
+
+@contextmanager
+def trace_spans(path=None):
+    """
+    Record spans of the block and export them as Chrome trace (trace.json in addon data directory),
+    if enabled in settings
+    """
+    if not plugin.get_setting('trace-spans', bool):
+        yield
+        return
+    from util.tracing import default_tracer as tracer
+    for module_name, class_name, method_name, cat in TRACED_METHODS:
+        __import__(module_name)
+        tracer.instrument(getattr(sys.modules[module_name], class_name), method_name, cat=cat)
+    path = path or plugin.addon_data_path('trace.json')
+    tracer.start()
+    try:
+        yield
+    finally:
+        tracer.stop()
+        tracer.uninstrument()
+        tracer.export(path)
+        log.info("Trace of %d span(s) saved to %s", len(tracer.events), path)
+
+
+_profilers = threading.local()
+
+
+@contextmanager
+def profiling(name):
+    """
+    Sample stacks of the calling thread during the block into profiles/<name>.collapsed in addon data directory,
+    if enabled in settings. Profiler of an enclosing block on the same thread is paused meanwhile, so stacks
+    (e.g. of playback during /play) aren't sampled twice into different profiles.
+    """
+    if not plugin.get_setting('profile', bool):
+        yield
+        return
+    from util.profiler import SamplingProfiler
+    stack = _profilers.__dict__.setdefault('stack', [])
+    outer = stack[-1] if stack else None
+    if outer:
+        outer.stop()
+    profiler = SamplingProfiler(plugin.addon_data_path(os.path.join('profiles', name + '.collapsed')), log=log)
+    stack.append(profiler)
+    try:
+        with profiler:
+            yield
+    finally:
+        stack.pop()
+        if outer:
+            outer.start()
+
+
+def push_metrics():
+    """
+    Hand metrics recorded by this plugin call over to the service. Nothing is pushed (and the storage isn't
+    opened) if nothing was recorded or the service doesn't use metrics. Failures are only logged, so they don't
+    replace an error of the call itself.
+    """
+    import okino.container as container
+    from util.metrics import default_registry
+    try:
+        if default_registry.empty() or not container.metrics_enabled():
+            return
+        store = container.metrics_store()
+        store.push()
+        store.storage.close()
+    except Exception as e:
+        log.exception(e)
 
 
 def get_free_space(folder):
@@ -259,6 +499,10 @@ def singleton(func):
             memoized.append(func())
         return memoized[0]
 
+    def reset():
+        del memoized[:]
+
+    singleton_wrapper.reset = reset
     return singleton_wrapper
 
 
@@ -271,6 +515,9 @@ def batch(iterable, size=None):
         yield list(chain([batchiter.next()], batchiter))
 
 
+_localized_tables = {}
+
+
 class LocalizedEnum(Enum):
     @property
     def lang_id(self):
@@ -278,8 +525,29 @@ class LocalizedEnum(Enum):
 
     @property
     def localized(self):
-        return self.localized_title if hasattr(self, 'localized_title') \
-            else lang(self.lang_id)
+        return self.localized_title(self.lang_id)
+
+    def localized_title(self, lang_id):
+        """
+        String with given lang_id from the table of the enum, fetched once per run
+        """
+        table = self.localized_table()
+        try:
+            return table[lang_id]
+        except KeyError:
+            title = table[lang_id] = lang(lang_id)
+            return title
+
+    @classmethod
+    def localized_table(cls):
+        """
+        Localized titles of the members by lang_id, each fetched once per run on first use
+        """
+        try:
+            return _localized_tables[cls]
+        except KeyError:
+            table = _localized_tables[cls] = {}
+            return table
 
     @classmethod
     def strings(cls):
@@ -28,6 +28,10 @@ def search_cache():
     return plugin.get_storage('search_cache.db', ttl=60)
 
 
+def torrent_cache():
+    return plugin.get_storage('torrent_cache.db', ttl=60*12)
+
+
 @singleton
 def scraper():
     from okino.scraper import OkinoScraper
@@ -108,7 +112,43 @@ def ace_stream():
     from okino.torrent.stream import AceStream
     return AceStream(engine=acestream_engine(),
                      buffering_progress=stream_buffering_progress(),
-                     playing_progress=stream_playing_progress())
+                     playing_progress=stream_playing_progress(),
+                     keep_engine_running=warm_engine_timeout() > 0)
+
+
+def warm_engine_timeout():
+    """
+    Seconds to keep streaming engine running after playback, 0 if warm engine mode is disabled
+    """
+    if not plugin.get_setting('warm-engine', bool):
+        return 0
+    return plugin.get_setting('warm-engine-timeout', int)*60
+
+
+@singleton
+def temp_space():
+    from okino.common import TempSpaceManager, temp_path
+    return TempSpaceManager(temp_path(), plugin.get_storage('temp_index.db'),
+                            plugin.get_setting('temp-max-size', int)*1024*1024*1024)
+
+
+def metrics_enabled():
+    """
+    Whether the service needs metrics of plugin calls: serves them on the metrics port or saves them
+    """
+    return plugin.get_setting('metrics-port', int) > 0 or plugin.get_setting('metrics-save', bool)
+
+
+@singleton
+def metrics_store():
+    from okino.storage import MetricsStore
+    from util.metrics import default_registry
+    return MetricsStore(plugin.get_storage('metrics.db'), default_registry, plugin.addon_data_path('metrics.json'))
+
+
+@singleton
+def warm_engine_storage():
+    return plugin.get_storage('warm_engine.db')
 
 
 @singleton
@@ -126,6 +166,9 @@ def torrent2http_engine():
                                listen_port=plugin.get_setting('t2h-listen-port', int, default=6881),
                                use_random_port=plugin.get_setting('t2h-use-random-port', bool),
                                trackers=['http://retracker.local/announce'],
+                               bind_host='127.0.0.1',
+                               bind_port=5001,
+                               max_idle_timeout=warm_engine_timeout() or None,
                                keep_files=True,
                                enable_utp=False)
 
@@ -136,7 +179,10 @@ def torrent2http_stream():
     return Torrent2HttpStream(engine=torrent2http_engine(),
                               buffering_progress=stream_buffering_progress(),
                               playing_progress=stream_playing_progress(),
-                              pre_buffer_bytes=plugin.get_setting('t2h-pre-buffer-mb', int)*1024*1024)
+                              pre_buffer_bytes=plugin.get_setting('t2h-pre-buffer-mb', int)*1024*1024,
+                              warm_idle_timeout=warm_engine_timeout(),
+                              warm_storage=warm_engine_storage(),
+                              prebuffer_next=plugin.get_setting('t2h-prebuffer-next', bool))
 
 
 @singleton
@@ -150,9 +196,21 @@ def torrent_stream():
 
 def torrent(url=None, data=None, file_name=None):
     from okino.torrent import Torrent
+    if url and data is None:
+        data = torrent_cache().get(url)
     return Torrent(url, data, file_name, http_client())
 
 
+@singleton
+def next_file_prefetcher():
+    from okino.prefetch import NextFilePrefetcher
+    return NextFilePrefetcher(scraper=scraper(),
+                              torrent_cache=torrent_cache(),
+                              http_client=http_client(),
+                              stream=torrent_stream(),
+                              percent=plugin.get_setting('prefetch-next-percent', int))
+
+
 @singleton
 def player():
     from okino.xbmcstuff import XbmcPlayer
@@ -185,6 +243,15 @@ def library_manager():
                           plugin.get_storage('library_items.db', cached=True))
 
 
+@singleton
+def library_change_feed():
+    from okino.library import LibraryChangeFeed
+    from okino.enumerations import Order, OrderDirection
+    # paging stops at the watermark, so the listing has to go from the latest date down
+    return LibraryChangeFeed(scraper(), search_filter(order_by=Order.DATE, order_dir=OrderDirection.DESC),
+                             common_storage())
+
+
 def common_storage():
     return plugin.get_storage('common.db', cached=True)
 
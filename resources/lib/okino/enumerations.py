@@ -3,7 +3,6 @@
 from __future__ import unicode_literals
 from util.enum import Enum
 from okino.common import LocalizedEnum
-from copy import copy
 
 try:
     from collections import OrderedDict
@@ -11,6 +10,13 @@ except ImportError:
     from util.ordereddict import OrderedDict
 
 
+_lookup_indexes = {}
+
+
+def _normalize(key):
+    return key.upper() if isinstance(key, basestring) else key
+
+
 class Attribute(LocalizedEnum):
     def get_lang_base(self):
         raise NotImplementedError()
@@ -31,17 +37,95 @@ class Attribute(LocalizedEnum):
         return "<%s.%s>" % (self.__class__.__name__, self._name_)
 
     @classmethod
-    def find(cls, what):
-        for i in cls.__iter__():
-            if what in i.value or i.name == what:
-                return i
-        return None
+    def find(cls, what, ignore_case=False):
+        """
+        Find member by its name or any of its value items (id, filter value, site title...)
+
+        :param ignore_case: Compare strings case-insensitively
+        """
+        try:
+            return cls.lookup_index(ignore_case).get(_normalize(what) if ignore_case else what)
+        except TypeError:
+            # unhashable value, can't be in the index anyway
+            return None
+
+    @classmethod
+    def lookup_index(cls, ignore_case=False):
+        """
+        Reverse lookup table {name or value item: member}, built on first use. If several members share the key,
+        the first one wins, as it did with scanning the members in order.
+        """
+        key = (cls, ignore_case)
+        if key not in _lookup_indexes:
+            index = {}
+            for i in cls:
+                for k in i.value + (i.name,):
+                    index.setdefault(_normalize(k) if ignore_case else k, i)
+            _lookup_indexes[key] = index
+        return _lookup_indexes[key]
 
     @classmethod
     def all(cls):
         return [g for g in cls if g.id > 0]
 
 
+class UnknownAttribute(object):
+    """
+    Attribute value met on the site but missing in its enum: the fallback member (e.g. Genre.OTHER) with the raw
+    title from the site. Acts like the member otherwise. Instances are immutable and interned, so they can be
+    shared between threads and are pickled as (enum class, member name, title).
+    """
+    __slots__ = ('member', 'title')
+    _interned = {}
+
+    def __new__(cls, member, title):
+        """
+        :type member: Attribute
+        """
+        try:
+            return cls._interned[member, title]
+        except KeyError:
+            attr = object.__new__(cls)
+            object.__setattr__(attr, 'member', member)
+            object.__setattr__(attr, 'title', title)
+            return cls._interned.setdefault((member, title), attr)
+
+    def __getattr__(self, name):
+        return getattr(self.member, name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("can't set attribute")
+
+    @property
+    def localized(self):
+        return self.title
+
+    def __reduce__(self):
+        return _unknown_attribute, (self.member.__class__, self.member.name, self.title)
+
+    def __eq__(self, other):
+        return self is other
+
+    def __ne__(self, other):
+        return self is not other
+
+    def __hash__(self):
+        return hash((self.member, self.title))
+
+    def __nonzero__(self):
+        return bool(self.member)
+
+    def __lt__(self, other):
+        return self.localized < other.localized
+
+    def __repr__(self):
+        return "<%s.%s: %s>" % (self.member.__class__.__name__, self.member.name, self.title)
+
+
+def _unknown_attribute(cls, name, title):
+    return UnknownAttribute(getattr(cls, name), title)
+
+
 class Order(Attribute):
     RATING = (1, 'film.rtg_value')
     USER_RATING = (2, 'okino_rating.rtg_value')
@@ -67,18 +151,12 @@ class Section(Attribute):
     CARTOONS = (30, 'animation', 'Cartoons')
     ANIMATED_SERIES = (40, 'animseries', 'Animated Series')
 
-    # noinspection PyUnusedLocal
-    def __init__(self, *args):
-        self.lang_base = 31000
-
     def get_lang_base(self):
-        return self.lang_base
+        return 31000
 
     @property
-    def singular(self):
-        c = copy(self)
-        c.lang_base = 31040
-        return c
+    def localized_singular(self):
+        return self.localized_title(31040 + self.id)
 
     @property
     def folder_name(self):
@@ -19,7 +19,17 @@ def get_skin_resolution():
         return Resolution(int(res.attrib["width"]), int(res.attrib["height"]))
 
 
-SKIN_RESOLUTION = get_skin_resolution()
+_skin_resolution = None
+
+
+def skin_resolution():
+    """
+    Skin resolution, skin's addon.xml is parsed on first use only
+    """
+    global _skin_resolution
+    if _skin_resolution is None:
+        _skin_resolution = get_skin_resolution()
+    return _skin_resolution
 
 
 class Align:
@@ -101,7 +111,8 @@ class Image(xbmcgui.ControlImage):
 def positionControl(control, alignment=0, width=1, height=1, offsetX=0, offsetY=0, parent=None):
     if parent is None:
         parentX, parentY = 0, 0
-        parentWidth, parentHeight = SKIN_RESOLUTION.width, SKIN_RESOLUTION.height
+        resolution = skin_resolution()
+        parentWidth, parentHeight = resolution.width, resolution.height
     else:
         parentX, parentY = parent.getX(), parent.getY()
         parentWidth, parentHeight = parent.getWidth(), parent.getHeight()
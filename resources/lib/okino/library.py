@@ -2,26 +2,157 @@
 
 import os
 import logging
+import hashlib
+import threading
 from xbmcswift2 import xbmcvfs, direxists
-from okino.scraper import Folder, Details
+from okino.enumerations import Flag
 from okino.enumerations import Section
-from util.encoding import ensure_str
+from util.encoding import ensure_str, ensure_unicode
+from util.timer import Timer
+from concurrent.futures import ThreadPoolExecutor
 from plugin import plugin
 
 
+class LibraryWriter:
+    """
+    Writes and deletes library files in batches with a small pool of workers (each VFS call may be a network
+    round trip on NAS). Files are written atomically through a temporary file and rename.
+    """
+    def __init__(self, max_workers=4, log=None):
+        self.max_workers = max_workers
+        self.log = log or logging.getLogger(__name__)
+        self.written = 0
+        self.deleted = 0
+        self.elapsed = 0.0
+        self._listings = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """
+        Forget cached directory listings and counters, e.g. before the next library update
+        """
+        self.written = 0
+        self.deleted = 0
+        self.elapsed = 0.0
+        with self._lock:
+            self._listings = {}
+
+    def listdir(self, path):
+        """
+        Return names of files in the directory (listed only once per writer)
+
+        :rtype : set
+        """
+        if path not in self._listings:
+            self._listings[path] = set(ensure_unicode(name) for name in xbmcvfs.listdir(path)[1])
+        return self._listings[path]
+
+    def write(self, files):
+        """
+        :param files: List of (path, content) tuples
+        :return: List of paths actually written
+        """
+        if not files:
+            return []
+        with Timer(logger=self.log, name="Writing %d library file(s)" % len(files)) as timer:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                written = [path for path in executor.map(self._write_file, files) if path]
+        self.written += len(written)
+        self.elapsed += timer.interval
+        self.log.info("Written %d of %d library file(s) in %.2f second(s)", len(written), len(files), timer.interval)
+        return written
+
+    def delete(self, paths):
+        """
+        :return: Number of files deleted
+        """
+        if not paths:
+            return 0
+        with Timer(logger=self.log, name="Deleting %d library file(s)" % len(paths)) as timer:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                deleted = sum(executor.map(self._delete_file, paths))
+        self.deleted += deleted
+        self.elapsed += timer.interval
+        self.log.info("Deleted %d of %d library file(s) in %.2f second(s)", deleted, len(paths), timer.interval)
+        return deleted
+
+    def _write_file(self, item):
+        path, content = item
+        tmp_path = path + '.tmp'
+        fp = xbmcvfs.File(tmp_path, 'w')
+        try:
+            fp.write(ensure_str(content))
+        finally:
+            fp.close()
+        if not xbmcvfs.rename(tmp_path, path):
+            self.log.warn("Can't rename %s to %s", tmp_path, path)
+            xbmcvfs.delete(tmp_path)
+            return None
+        self.log.info("Added file: %s", path)
+        self._update_listing(path, True)
+        return path
+
+    def _delete_file(self, path):
+        if not xbmcvfs.delete(path):
+            self.log.warn("Can't delete file: %s", path)
+            return 0
+        self.log.info("Removed file: %s", path)
+        self._update_listing(path, False)
+        return 1
+
+    def _update_listing(self, path, exists):
+        dir_name, name = os.path.split(path)
+        with self._lock:
+            if dir_name in self._listings:
+                if exists:
+                    self._listings[dir_name].add(ensure_unicode(name))
+                else:
+                    self._listings[dir_name].discard(ensure_unicode(name))
+
+
 class LibraryManager:
-    def __init__(self, path, storage, log=None):
+    """
+    Keeps library folders in sync with okino.ru folders.
+
+    Storage maps folder ID to (media_id, media_path, manifest), where manifest is a dict with 'files'
+    (file ID -> .strm name), 'hash' (hash of the folder contents written), 'date' (media update date) and
+    'flag' (name of the media flag in the listing). Entries created by older versions have no manifest.
+    """
+    def __init__(self, path, storage, writer=None, log=None):
+        """
+        :type writer: LibraryWriter
+        """
         self.path = path
         self.storage = storage
         self.log = log or logging.getLogger(__name__)
+        self.writer = writer or LibraryWriter(log=self.log)
+        self._dir_exists = {}
         self.create_folders()
 
+    def reset_caches(self):
+        """
+        Forget which directories exist and what they contain, so a long-living manager sees changes
+        made to the library outside of it since the previous update
+        """
+        self._dir_exists = {}
+        self.writer.reset()
+
+    def _direxists(self, path):
+        if path not in self._dir_exists:
+            self._dir_exists[path] = direxists(path)
+        return self._dir_exists[path]
+
+    def _manifest(self, folder_id):
+        entry = self.storage.get(folder_id)
+        return entry[2] if entry and len(entry) > 2 else None
+
     def create_folders(self):
         for s in list(Section):
             path = self.get_section_path(s)
-            if not direxists(path):
+            if not self._direxists(path):
                 self.log.info("Creating directory: %s", path)
                 xbmcvfs.mkdirs(path)
+                self._dir_exists[path] = True
 
     def get_section_path(self, section):
         return os.path.join(self.path, section.folder_name)
@@ -40,30 +171,73 @@ class LibraryManager:
         file_name = LibraryManager.clean_path_component(file_name)
         return "%s [%d].strm" % (file_name, folder_id)
 
-    def update_folder(self, details, folder):
+    @staticmethod
+    def content_hash(details, folder):
+        """
+        :type details: Details
+        :type folder: Folder
+        """
+        content = [details.media_id, details.section.is_series()] + [(f.id, f.title, f.link) for f in folder.files]
+        return hashlib.md5(repr(content)).hexdigest()
+
+    def update_folder(self, details, folder, media=None):
         """
+        Write the difference between folder files and the stored manifest to the library folder
+
         :type details: Details
         :type folder: Folder
+        :type media: Media
+        :param media: Listing entry of the media, its date and flag are stored to detect changes next time.
+            Without it (full update) files are listed instead of trusting the manifest, so deleted ones are
+            written again.
         """
         media_path = self.get_media_path(details.section, details.title)
-        if not direxists(media_path):
+        entry = self.storage.get(folder.id)
+        manifest = self._manifest(folder.id) if entry and entry[1] == media_path else None
+        content_hash = self.content_hash(details, folder)
+        if media:
+            date, flag = media.date, media.flag and media.flag.name
+        else:
+            date, flag = manifest and manifest.get('date'), manifest and manifest.get('flag')
+        if manifest and manifest['hash'] == content_hash and self._direxists(media_path) and \
+                (media or set(manifest['files'].values()) <= self.writer.listdir(media_path)):
+            self.log.info("Library folder is up to date: %s", media_path)
+            if date != manifest.get('date') or flag != manifest.get('flag'):
+                self.storage[folder.id] = (details.media_id, media_path, dict(manifest, date=date, flag=flag))
+            return media_path
+
+        if not self._direxists(media_path):
             self.log.info("Creating library folder: %s", media_path)
             xbmcvfs.mkdir(media_path)
+            self._dir_exists[media_path] = True
+            existing = set()
         else:
             self.log.info("Updating library folder: %s", media_path)
-        self.storage[folder.id] = (details.media_id, media_path)
+            if manifest and media:
+                existing = set(manifest['files'].values())
+            else:
+                existing = set(self.writer.listdir(media_path))
         files = folder.files
         """ :type : list of File """
-        for f in files:
-            file_path = os.path.join(media_path, self.get_file_name(folder.id, f.title))
-            if not xbmcvfs.exists(file_path):
-                self.log.info("Adding file: %s", file_path)
-                fp = xbmcvfs.File(file_path, 'w')
-                can_mark_watched = len(files) == 1 and not details.section.is_series()
-                url = plugin.url_for('play_file', media_id=details.media_id, url=f.link,
-                                     title=f.title, can_mark_watched=int(can_mark_watched))
-                fp.write(ensure_str(url))
-                fp.close()
+        names = dict((f.id, self.get_file_name(folder.id, f.title)) for f in files)
+        can_mark_watched = len(files) == 1 and not details.section.is_series()
+        missing = [f for f in files if names[f.id] not in existing]
+        written = self.writer.write([(os.path.join(media_path, names[f.id]),
+                                      plugin.url_for('play_file', media_id=details.media_id, url=f.link,
+                                                     title=f.title, folder_id=folder.id,
+                                                     can_mark_watched=int(can_mark_watched)))
+                                     for f in missing])
+        suffix = "[%d].strm" % folder.id
+        wanted = set(names.values())
+        self.writer.delete([os.path.join(media_path, name) for name in existing
+                            if name.endswith(suffix) and name not in wanted])
+        written = set(os.path.basename(path) for path in written)
+        stored = dict((file_id, name) for file_id, name in names.iteritems() if name in existing or name in written)
+        if len(stored) < len(names):
+            # some files weren't written, don't let the hash mark the folder as up to date
+            content_hash = None
+        self.storage[folder.id] = (details.media_id, media_path,
+                                   {'files': stored, 'hash': content_hash, 'date': date, 'flag': flag})
         return media_path
 
     def remove_folder(self, folder_id):
@@ -71,24 +245,20 @@ class LibraryManager:
             return
         media_path = self.storage[folder_id][1]
         del self.storage[folder_id]
-        if not direxists(media_path):
+        if not self._direxists(media_path):
             return
         self.log.info("Removing from library folder: %s", media_path)
-        files = xbmcvfs.listdir(media_path)[1]
-        count_deleted = 0
-        for f in files:
-            if f.endswith("[%d].strm" % folder_id):
-                path = os.path.join(media_path, f)
-                self.log.info("Removing file: %s", path)
-                xbmcvfs.delete(path)
-                count_deleted += 1
+        files = list(self.writer.listdir(media_path))
+        count_deleted = self.writer.delete([os.path.join(media_path, f) for f in files
+                                            if f.endswith("[%d].strm" % folder_id)])
         if len(files) == count_deleted:
             self.log.info("All files deleted, removing folder: %s", media_path)
             xbmcvfs.rmdir(media_path)
+            self._dir_exists[media_path] = False
 
     def has_folder(self, folder_id):
         if folder_id in self.storage:
-            if direxists(self.storage[folder_id][1]):
+            if self._direxists(self.storage[folder_id][1]):
                 return True
             else:
                 del self.storage[folder_id]
@@ -110,8 +280,87 @@ class LibraryManager:
                 media_ids.append(media_id)
         return media_ids
 
+    def changed_media_ids(self, medias):
+        """
+        Select library media which may have been updated since they were last written to the library.
+
+        Dates are of day precision, so media dated the same day as the last write are selected as well:
+        their folders are refetched, but files are rewritten only if the content hash has changed.
+
+        :type medias: list[Media]
+        """
+        manifests = {}
+        for folder_id, item in self.storage.items():
+            manifests.setdefault(item[0], []).append(self._manifest(folder_id) or {})
+        changed = []
+        for media in medias:
+            if media.id not in manifests or media.id in changed:
+                continue
+            for manifest in manifests[media.id]:
+                date = manifest.get('date')
+                new_series = media.flag == Flag.NEW_SERIES and manifest.get('flag') != Flag.NEW_SERIES.name
+                if date is None or manifest.get('hash') is None or media.date >= date or new_series:
+                    changed.append(media.id)
+                    break
+        return changed
 
-def update_library():
+
+class LibraryChangeFeed:
+    """
+    Pages the listing of recently updated media until the date seen on the previous poll (the watermark)
+    """
+    def __init__(self, scraper, search_filter, storage, max_pages=10, log=None):
+        """
+        :type scraper: AbstractScraper
+        :type storage: dict
+        """
+        self.scraper = scraper
+        self.search_filter = search_filter
+        self.storage = storage
+        self.max_pages = max_pages
+        self.log = log or logging.getLogger(__name__)
+
+    @property
+    def watermark(self):
+        return self.storage.get('library_watermark')
+
+    def poll(self):
+        """
+        Return media updated since the previous poll (on the first poll - only the first page)
+
+        :rtype : list[Media]
+        """
+        watermark = self.watermark
+        medias = []
+        skip = None
+        for _ in range(self.max_pages):
+            page = self.scraper.search(self.search_filter, skip)
+            if not isinstance(page, list) or not page:
+                break
+            medias.extend(page)
+            dates = [m.date for m in page if m.date]
+            if watermark is None or not self.scraper.has_more or dates and max(dates) < watermark:
+                break
+            skip = (skip or 0) + len(page)
+        dates = [m.date for m in medias if m.date]
+        if watermark is not None:
+            dates.append(watermark)
+        if dates:
+            self.storage['library_watermark'] = max(dates)
+        if watermark is not None:
+            medias = [m for m in medias if not m.date or m.date >= watermark]
+        self.log.info("Change feed: %d media updated since %s", len(medias), watermark)
+        return medias
+
+
+def update_library(medias=None):
+    """
+    Update library folders
+
+    :type medias: list[Media]
+    :param medias: Recently updated media, only changed library items among them will be refetched.
+                   If not given, all library items are refetched.
+    """
     import okino.container as container
     from plugin import plugin
     from okino.common import lang, batch, abort_requested
@@ -120,8 +369,18 @@ def update_library():
 
     log = logging.getLogger(__name__)
     library_manager = container.library_manager()
+    library_manager.reset_caches()
     scraper = container.scraper()
-    media_ids = library_manager.stored_media_ids()
+    if medias is None:
+        media_ids = library_manager.stored_media_ids()
+    else:
+        media_ids = library_manager.changed_media_ids(medias)
+        medias = dict((m.id, m) for m in medias)
+        if not media_ids:
+            return
+        for media_id in media_ids:
+            if media_id in scraper.folders_cache:
+                del scraper.folders_cache[media_id]
     if media_ids:
         log.info("Starting Okino.ru library update...")
         progress = xbmcgui.DialogProgressBG()
@@ -135,12 +394,18 @@ def update_library():
                     if media_id in all_folders:
                         for folder in all_folders[media_id]:
                             if library_manager.has_folder(folder.id):
-                                library_manager.update_folder(details, folder)
+                                library_manager.update_folder(details, folder, medias and medias.get(media_id))
                 processed += len(ids)
-                progress.update(processed*100/len(media_ids))
+                writer = library_manager.writer
+                progress.update(processed*100/len(media_ids), message=lang(40325) %
+                                (writer.written, writer.deleted, writer.elapsed))
                 if abort_requested():
                     break
         log.info("Okino.ru library update finished.")
+    writer = library_manager.writer
+    if medias is not None and not writer.written and not writer.deleted:
+        # same-day media were refetched, but nothing has actually changed
+        return
     if plugin.get_setting('update-xbmc-library', bool):
         log.info("Starting XBMC library update...")
         plugin.update_library('video', library_manager.path)
@@ -4,7 +4,6 @@ from okino.common import lang, filter_dict, date_to_str
 from okino.plugin import plugin
 from okino.plugin.contextmenu import search_result_context_menu, toggle_watched_context_menu, \
     refresh_context_menu, download_torrent_context_menu, library_context_menu, toggle_auto_refresh_context_menu
-from okino.scraper import Details, Media, Folder, File
 import titleformat as tf
 
 
@@ -69,7 +68,8 @@ def itemify_file(f, **kwargs):
         },
         'stream_info': [],
         'is_playable': True,
-        'path': plugin.url_for('play_file', media_id=f.media_id, url=f.link, title=f.title, **kwargs)
+        'path': plugin.url_for('play_file', media_id=f.media_id, url=f.link, title=f.title, folder_id=f.folder_id,
+                               **kwargs)
     }
     item['stream_info'].extend(('video', {
         'codec': stream.codec,
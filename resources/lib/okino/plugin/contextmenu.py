@@ -3,7 +3,6 @@ from okino import container as container
 from okino.plugin import plugin
 from okino.common import lang, save_path
 from util.encoding import ensure_str
-from okino.torrent.client import *
 from xbmcswift2 import actions, xbmcgui, xbmc
 
 
@@ -86,7 +85,7 @@ def refresh(media_id):
 def add_bookmark(section, media_id, title):
     bookmarks = container.bookmarks()
     bookmarks.add(media_id, section)
-    # notify(lang(40308) % (Section.find(section).singular.localized, ensure_unicode(title)))
+    # notify(lang(40308) % (Section.find(section).localized_singular, ensure_unicode(title)))
     plugin.refresh()
 
 
@@ -180,6 +179,19 @@ def search_result_context_menu(details, date_added=None, total_size=None):
 def download_torrent(url):
     client = container.torrent_client()
     client.add(container.torrent(url), save_path(local=True))
+    offer_client_addon(client)
+
+
+@plugin.route('/download/folder/<media_id>/<folder_id>')
+def download_folder(media_id, folder_id):
+    client = container.torrent_client()
+    files = container.scraper().get_files_cached(media_id, int(folder_id))
+    client.add_many([container.torrent(f.link) for f in files], save_path(local=True))
+    offer_client_addon(client)
+
+
+def offer_client_addon(client):
+    from okino.torrent.client import TransmissionClient, UTorrentClient
     if isinstance(client, TransmissionClient):
         name = 'Transmission'
         addon_id = 'script.transmission'
@@ -200,6 +212,14 @@ def download_torrent_context_menu(url):
         return []
 
 
+def download_folder_context_menu(media_id, folder_id):
+    if container.torrent_client():
+        return [(lang(40326), actions.background(plugin.url_for('download_folder', media_id=media_id,
+                                                                folder_id=folder_id)))]
+    else:
+        return []
+
+
 def clear_history_context_menu():
     return [(lang(40315), actions.background(plugin.url_for('clear_history')))]
 
@@ -2,13 +2,9 @@
 
 from okino.plugin import plugin
 from okino.common import lang, batch, abort_requested, save_files, purge_temp_dir, log
-from okino.plugin.common import with_fanart, itemify_file, itemify_folder, \
-    itemify_details, itemify_bookmarks, itemify_library_folder
 from okino.enumerations import Section, Genre
-from okino.plugin.search import make_search
-from okino.plugin.contextmenu import toggle_watched_context_menu, bookmark_context_menu, \
-    download_torrent_context_menu, clear_history_context_menu, library_context_menu
 from util.encoding import ensure_unicode
+from contextlib import nested
 
 import titleformat as tf
 import okino.container as container
@@ -16,6 +12,7 @@ import okino.container as container
 
 @plugin.route('/play/<media_id>/<url>/<title>')
 def play_file(media_id, url, title):
+    from okino.plugin.common import itemify_details
     stream = container.torrent_stream()
     scraper = container.scraper()
     history = container.history()
@@ -29,6 +26,15 @@ def play_file(media_id, url, title):
     history.storage.sync()
     torrent = container.torrent(url=url)
     player = container.player()
+    folder_id = plugin.request.arg('folder_id')
+    prefetch = nested()
+    if folder_id and plugin.get_setting('prefetch-next', bool):
+        prefetcher = container.next_file_prefetcher()
+        try:
+            next_file = prefetcher.next_file(media_id, int(folder_id), url)
+            prefetch = prefetcher.watch(player, next_file, torrent)
+        except Exception as e:
+            log.warn("Can't find next file of the folder: %s", e)
 
     def check_and_mark_watched(event):
         log.info("Playback event: %s, current player progress: %d", event, player.get_percent())
@@ -38,7 +44,10 @@ def play_file(media_id, url, title):
                                total_size=meta.get('total_size'))
 
     player.attach([player.PLAYBACK_STOPPED, player.PLAYBACK_ENDED], check_and_mark_watched)
-    temp_files = stream.play(player, torrent, item)
+    with prefetch:
+        temp_files = stream.play(player, torrent, item)
+    if stream.played_paths:
+        container.temp_space().touch(stream.played_paths)
     if temp_files:
         save_files(temp_files, rename=not stream.saved_files_needed, on_finish=purge_temp_dir)
     else:
@@ -47,15 +56,18 @@ def play_file(media_id, url, title):
 
 @plugin.route('/files/<media_id>/<folder_id>')
 def show_files(media_id, folder_id):
+    from okino.plugin.common import itemify_file
     scraper = container.scraper()
     plugin.set_content('movies')
     files = scraper.get_files_cached(media_id, folder_id)
-    plugin.add_items(itemify_file(f) for f in files)
+    plugin.add_items((itemify_file(f) for f in files), len(files))
     plugin.finish(sort_methods=['unsorted', 'title', 'duration', 'size'])
 
 
 @plugin.route('/folders/<media_id>')
 def show_folders(media_id):
+    from okino.plugin.common import itemify_file, itemify_folder
+    from okino.plugin.contextmenu import library_context_menu, download_folder_context_menu
     scraper = container.scraper()
     meta_cache = container.meta_cache()
     meta = meta_cache.setdefault(media_id, {})
@@ -70,12 +82,14 @@ def show_folders(media_id):
             item['context_menu'] += library_context_menu(media_id, f.id)
         else:
             item = itemify_folder(f)
+            item['context_menu'] += download_folder_context_menu(media_id, f.id)
         plugin.add_item(item)
     plugin.finish(sort_methods=['unsorted', 'title', 'duration', 'size'])
 
 
 @plugin.route('/explore/<section>')
 def explore(section):
+    from okino.plugin.search import make_search
     plugin.set_content('movies')
     sf = container.search_filter(sections=[Section[section]])
     header = [
@@ -89,12 +103,14 @@ def explore(section):
 
 @plugin.route('/genre/<section>')
 def genre_index(section):
+    from okino.plugin.common import with_fanart
     return with_fanart([{'label': g.localized, 'path': plugin.url_for('by_genre', section=section, genre=g.name)}
                        for g in sorted(Genre.all())])
 
 
 @plugin.route('/genre/<section>/<genre>')
 def by_genre(section, genre):
+    from okino.plugin.search import make_search
     plugin.set_content('movies')
     sf = container.search_filter(sections=[Section[section]], genres=[Genre[genre]])
     make_search(sf)
@@ -103,6 +119,7 @@ def by_genre(section, genre):
 @plugin.route('/bookmarks', options={'section': None}, name='global_bookmarks')
 @plugin.route('/bookmarks/<section>')
 def bookmarks_index(section):
+    from okino.plugin.common import itemify_bookmarks
     plugin.set_content('movies')
     bookmarks = container.bookmarks()
     media_ids = bookmarks.get(section)
@@ -125,6 +142,9 @@ def clear_history():
 @plugin.route('/history', options={'section': None}, name='global_history')
 @plugin.route('/history/<section>')
 def history_index(section):
+    from okino.plugin.common import with_fanart
+    from okino.plugin.contextmenu import toggle_watched_context_menu, bookmark_context_menu, \
+        download_torrent_context_menu, clear_history_context_menu
     plugin.set_content('movies')
     history = container.history()
     items = []
@@ -145,6 +165,7 @@ def history_index(section):
 
 @plugin.route('/library')
 def library_items():
+    from okino.plugin.common import itemify_library_folder
     scraper = container.scraper()
     library_manager = container.library_manager()
     media_ids = library_manager.stored_media_ids()
@@ -162,6 +183,7 @@ def library_items():
 
 @plugin.route('/')
 def index():
+    from okino.plugin.common import with_fanart
     items = [
         {'label': lang(34000), 'path': plugin.url_for('global_search')},
         {'label': lang(34002), 'path': plugin.url_for('global_bookmarks')},
@@ -4,7 +4,6 @@ from okino.common import lang, batch, abort_requested, notify
 from okino.enumerations import Section
 from okino.plugin import plugin
 from okino.plugin.common import with_fanart, itemify_search_results, itemify_single_result
-from okino.scraper import Details
 from util.encoding import ensure_unicode
 from xbmcswift2 import actions
 
@@ -91,6 +90,7 @@ def search_index(section):
 
 
 def make_search(sf, header=None, cache_to_disc=False, update_listing=False):
+    from okino.scraper import Details
     skip = plugin.request.arg('skip')
     scraper = container.scraper()
     results = scraper.search_cached(sf, skip)
@@ -1,10 +1,31 @@
 # -*- coding: utf-8 -*-
 
-from okino.scraper import Folder, Flag, File, Media, Details
+from collections import namedtuple
+from okino.enumerations import Flag
 from okino.common import lang
 from okino.plugin import plugin
 
 
+ShowFlags = namedtuple('ShowFlags', 'rating, original_title, genre, country, language, video_quality, '
+                                     'audio_quality, total_size, duration')
+
+_show_flags = (None, None)
+
+
+def show_flags():
+    """
+    Which optional parts of titles to show ("show-*" settings), computed once per settings snapshot
+
+    :rtype : ShowFlags
+    """
+    global _show_flags
+    snapshot, flags = _show_flags
+    if snapshot is None or snapshot is not plugin.settings_snapshot:
+        flags = ShowFlags(*[plugin.get_setting('show-' + name.replace('_', '-'), bool) for name in ShowFlags._fields])
+        _show_flags = (plugin.settings_snapshot, flags)
+    return flags
+
+
 def declension_ru(n, s1, s2, s5):
     ns = n % 10
     n2 = n % 100
@@ -71,19 +92,63 @@ def years(start_year, end_year):
         return "%d-%d" % (start_year, end_year)
 
 
+def localized(attrs):
+    return "/".join(a.localized for a in attrs)
+
+
+_formatters = {}
+
+
+def compiled(parts):
+    """
+    Get formatter joining rendered parts, compiled once for the current show-* settings combination.
+
+    Each part is a tuple (flag, render) where flag is ShowFlags field enabling the part (or None if the part
+    is always shown) and render is a function of formatter arguments returning the part string.
+    """
+    show = show_flags()
+    try:
+        return _formatters[parts, show]
+    except KeyError:
+        renders = [render for flag, render in parts if flag is None or getattr(show, flag)]
+
+        def formatter(*args):
+            return u"".join([render(*args) for render in renders])
+        _formatters[parts, show] = formatter
+        return formatter
+
+
+MEDIA_TITLE = (
+    (None, lambda m: flag_label(m.flag)),
+    ('rating', lambda m: " (%s)" % m.rating if m.rating else ""),
+    (None, lambda m: " %s" % color(m.title, 'white')),
+    ('original_title', lambda m: " / %s" % m.original_title if m.original_title else ""),
+    (None, lambda m: " / %s" % years(m.start_year, m.end_year)),
+    ('genre', lambda m: ", %s" % localized(m.genres)),
+    ('country', lambda m: ", %s" % localized(m.countries)),
+    ('language', lambda m: ", %s" % localized(m.languages)),
+    ('video_quality', lambda m: " [%s]" % "/".join(l.format.localized for l in m.quality)),
+)
+
+
 def media_title(media):
     """
     :type media: Media
     """
-    return (flag_label(media.flag)) + \
-           (" (%s)" % media.rating if media.rating and plugin.get_setting('show-rating', bool) else "") + \
-           (" %s" % color(media.title, 'white')) + \
-           (" / %s" % media.original_title if media.original_title and plugin.get_setting('show-original-title', bool) else "") + \
-           (" / %s" % years(media.start_year, media.end_year)) + \
-           (", %s" % ("/".join(g.localized for g in media.genres)) if plugin.get_setting('show-genre', bool) else "") + \
-           (", %s" % ("/".join(c.localized for c in media.countries)) if plugin.get_setting('show-country', bool) else "") + \
-           (", %s" % ("/".join(l.localized for l in media.languages)) if plugin.get_setting('show-language', bool) else "") + \
-           (" [%s]" % ("/".join(l.format.localized for l in media.quality)) if plugin.get_setting('show-video-quality', bool) else "")
+    return compiled(MEDIA_TITLE)(media)
+
+
+BOOKMARK_TITLE = (
+    (None, lambda d, folders: flag_label(next((f.flag for f in folders if f.flag), None))),
+    ('rating', lambda d, folders: " (%s)" % d.ratings['imdb'] if 'imdb' in d.ratings else ""),
+    (None, lambda d, folders: " %s" % color(d.title, 'white')),
+    ('original_title', lambda d, folders: " / %s" % d.original_title if d.original_title else ""),
+    (None, lambda d, folders: " / %s" % years(d.start_year, d.end_year)),
+    (None, lambda d, folders: " / %s" % d.section.localized_singular),
+    ('genre', lambda d, folders: ", %s" % localized(d.genres)),
+    ('country', lambda d, folders: ", %s" % localized(d.countries)),
+    ('video_quality', lambda d, folders: " [%s]" % localized(set(f.fmt for f in folders))),
+)
 
 
 def bookmark_title(details, folders):
@@ -91,29 +156,24 @@ def bookmark_title(details, folders):
     :type details: Details
     :type folders: list[Folder]
     """
-    flag = next((f.flag for f in folders if f.flag), None)
-    formats = list(set(f.fmt for f in folders))
-    return (flag_label(flag)) + \
-           (" (%s)" % details.ratings['imdb'] if 'imdb' in details.ratings and plugin.get_setting('show-rating', bool) else "") + \
-           (" %s" % color(details.title, 'white')) + \
-           (" / %s" % details.original_title if details.original_title and plugin.get_setting('show-original-title', bool) else "") + \
-           (" / %s" % years(details.start_year, details.end_year)) + \
-           (" / %s" % details.section.singular.localized) + \
-           (", %s" % ("/".join(g.localized for g in details.genres)) if plugin.get_setting('show-genre', bool) else "") + \
-           (", %s" % ("/".join(c.localized for c in details.countries)) if plugin.get_setting('show-country', bool) else "") + \
-           (" [%s]" % ("/".join(f.localized for f in formats)) if plugin.get_setting('show-video-quality', bool) else "")
+    return compiled(BOOKMARK_TITLE)(details, folders)
+
+
+FOLDER_TITLE = (
+    (None, lambda f: "%s %s / %d %s" % (flag_label(f.flag), color(f.title, 'white'), len(f.files),
+                                        declension_ru(len(f.files), lang(34005), lang(34006), lang(34007)))),
+    ('video_quality', lambda f: ", %s" % f.quality.video.localized if f.quality.video else ""),
+    ('audio_quality', lambda f: ", %s" % f.quality.audio.localized if f.quality.audio else ""),
+    ('total_size', lambda f: ", %s" % human_size(f.size)),
+    ('duration', lambda f: " [%s]" % human_duration(f.duration)),
+)
 
 
 def folder_title(folder):
     """
     :type folder: Folder
     """
-    return "%s %s / %d %s" % (flag_label(folder.flag), color(folder.title, 'white'), len(folder.files),
-                              declension_ru(len(folder.files), lang(34005), lang(34006), lang(34007))) + \
-           (", %s" % folder.quality.video.localized if folder.quality.video and plugin.get_setting('show-video-quality', bool) else "") + \
-           (", %s" % folder.quality.audio.localized if folder.quality.audio and plugin.get_setting('show-audio-quality', bool) else "") + \
-           (", %s" % human_size(folder.size) if plugin.get_setting('show-total-size', bool) else "") + \
-           (" [%s]" % human_duration(folder.duration) if plugin.get_setting('show-duration', bool) else "")
+    return compiled(FOLDER_TITLE)(folder)
 
 
 def library_folder_title(details, folder):
@@ -122,7 +182,7 @@ def library_folder_title(details, folder):
     :type folder: Folder
     """
     return "%s %s / %s / %s / %d %s" % (flag_label(folder.flag), color(details.title, 'white'),
-                                        details.section.singular.localized, folder.title, len(folder.files),
+                                        details.section.localized_singular, folder.title, len(folder.files),
                                         declension_ru(len(folder.files), lang(34005), lang(34006), lang(34007)))
 
 
@@ -144,13 +204,27 @@ def human_duration(total_seconds):
         return "%02d:%02d" % (minutes, seconds)
 
 
+FILE_TITLE = (
+    (None, lambda f: "%s %s / %s" % (flag_label(f.flag), color(f.title, 'white'), f.file_format)),
+    ('total_size', lambda f: ", %s" % human_size(f.size)),
+    ('duration', lambda f: " [%s]" % human_duration(f.duration)),
+)
+
+
 def file_title(f):
     """
     :type f: File
     """
-    return "%s %s / %s" % (flag_label(f.flag), color(f.title, 'white'), f.file_format) + \
-           (", %s" % human_size(f.size) if plugin.get_setting('show-total-size', bool) else "") + \
-           (" [%s]" % human_duration(f.duration) if plugin.get_setting('show-duration', bool) else "")
+    return compiled(FILE_TITLE)(f)
+
+
+FOLDER_FILE_TITLE = (
+    (None, lambda folder, f: "%s %s / %s" % (flag_label(folder.flag), color(f.title, 'white'), f.file_format)),
+    ('video_quality', lambda folder, f: ", %s" % folder.quality.video.localized if folder.quality.video else ""),
+    ('audio_quality', lambda folder, f: ", %s" % folder.quality.audio.localized if folder.quality.audio else ""),
+    ('total_size', lambda folder, f: ", %s" % human_size(f.size)),
+    ('duration', lambda folder, f: " [%s]" % human_duration(f.duration)),
+)
 
 
 def folder_file_title(folder, f):
@@ -158,8 +232,4 @@ def folder_file_title(folder, f):
     :type folder: Folder
     :type f: File
     """
-    return "%s %s / %s" % (flag_label(folder.flag), color(f.title, 'white'), f.file_format) + \
-           (", %s" % folder.quality.video.localized if folder.quality.video and plugin.get_setting('show-video-quality', bool) else "") + \
-           (", %s" % folder.quality.audio.localized if folder.quality.audio and plugin.get_setting('show-audio-quality', bool) else "") + \
-           (", %s" % human_size(f.size) if plugin.get_setting('show-total-size', bool) else "") + \
-           (" [%s]" % human_duration(f.duration) if plugin.get_setting('show-duration', bool) else "")
+    return compiled(FOLDER_FILE_TITLE)(folder, f)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+import threading
+
+from contextlib import contextmanager
+from okino.player import AbstractPlayer
+from okino.scraper import AbstractScraper, File
+from okino.torrent import Torrent, TorrentStream, TorrentError
+from util.encoding import ensure_unicode
+from util.httpclient import HttpClient
+
+
+class NextFilePrefetcher(object):
+    """
+    Prepares next file of the folder while the current one is playing, so the next play doesn't start cold.
+
+    Prefetch is triggered when playback passes given percent or when player queues next playlist item.
+    """
+    POLL_DELAY = 2
+
+    def __init__(self, scraper, torrent_cache, http_client=None, stream=None, percent=80, log=None):
+        """
+        :type scraper: AbstractScraper
+        :type torrent_cache: dict
+        :type http_client: HttpClient
+        :type stream: TorrentStream
+        """
+        self.scraper = scraper
+        self.torrent_cache = torrent_cache
+        self.http_client = http_client or HttpClient()
+        self.stream = stream
+        self.percent = percent
+        self.log = log or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._prefetched = set()
+
+    def next_file(self, media_id, folder_id, link):
+        """
+        Find the file following the one with given link in the folder
+
+        :rtype : File
+        """
+        files = self.scraper.get_files_cached(media_id, folder_id)
+        links = [f.link for f in files]
+        if link not in links:
+            return None
+        idx = links.index(link)+1
+        return files[idx] if idx < len(files) else None
+
+    def prefetch(self, f, playing=None):
+        """
+        Resolve given file: fetch its torrent into the cache and, if it turns out to be the torrent being played,
+        ask the stream to prebuffer the file within it.
+
+        :type f: File
+        :type playing: Torrent
+        """
+        with self._lock:
+            if f.link in self._prefetched:
+                return
+            self._prefetched.add(f.link)
+        self.log.info("Prefetching next file: %s", f.title)
+        try:
+            torrent = Torrent(f.link, self.torrent_cache.get(f.link), http_client=self.http_client)
+            self.torrent_cache[f.link] = torrent.data
+            if playing and hasattr(self.stream, 'prebuffer') and torrent.info_hash == playing.info_hash:
+                file_id = self.file_index(torrent, f)
+                if file_id is not None:
+                    self.stream.prebuffer(file_id)
+        except TorrentError as e:
+            self.log.warn("Can't prefetch torrent %s: %s", f.link, e)
+
+    def file_index(self, torrent, f):
+        """
+        Index of file f in its torrent: the file named after it or, failing that, the one following the file
+        being played
+
+        :type torrent: Torrent
+        :type f: File
+        """
+        for tf in torrent.files:
+            if ensure_unicode(os.path.basename(tf.path)) == ensure_unicode(f.title):
+                return tf.index
+        return torrent.next_file_index(getattr(self.stream, 'playing_file_id', None))
+
+    @contextmanager
+    def watch(self, player, f, playing=None):
+        """
+        Prefetch file f during playback once player reaches configured percent or queues next item
+
+        :type player: AbstractPlayer
+        :type f: File
+        :type playing: Torrent
+        """
+        if not f:
+            yield
+            return
+        stopped = threading.Event()
+
+        def poll():
+            while not stopped.wait(self.POLL_DELAY):
+                if player.is_playing() and player.get_percent() >= self.percent:
+                    self.prefetch(f, playing)
+                    break
+
+        def on_queue_next_item():
+            self.prefetch(f, playing)
+
+        thread = threading.Thread(target=poll)
+        thread.daemon = True
+        with player.attached(player.QUEUE_NEXT_ITEM, on_queue_next_item):
+            thread.start()
+            try:
+                yield
+            finally:
+                stopped.set()
@@ -23,6 +23,12 @@ class AbstractTorrentTransferProgress(AbstractFileTransferProgress):
         self.peers = peers
         self.update_transferred(bytes_transferred, progress=progress)
 
+    def is_visible(self):
+        """
+        Whether status updates are shown to anybody, so callers can skip polling for them
+        """
+        return True
+
     @staticmethod
     def _human_rate(rate_kbps):
         human, factor = None, None
@@ -68,6 +74,9 @@ class DummyTorrentTransferProgress(AbstractTorrentTransferProgress):
     def is_cancelled(self):
         return False
 
+    def is_visible(self):
+        return False
+
     def update(self, percent):
         pass
 
@@ -7,7 +7,8 @@ from urlparse import urlparse, parse_qs
 from okino.enumerations import *
 from okino.common import LocalizedError, str_to_date
 from util.phpserialize import loads, phpobject
-from util.timer import Timer
+from util.tracing import Span
+from util.metrics import default_registry as metrics
 from util.htmldocument import HtmlDocument
 from util.httpclient import HttpClient
 from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
@@ -59,6 +60,11 @@ class AbstractScraper:
         self.http_response = None
         self.has_more = False
 
+    @staticmethod
+    def _observe_warnings(page, warnings):
+        metrics.histogram('scraper_parse_warnings', "Parse warnings per page",
+                          buckets=(0, 1, 2, 5, 10, 20, 50)).observe(warnings, page=page)
+
     def fetch_page(self, url):
         try:
             self.http_response = self.http_client.fetch(url, timeout=self.timeout, **self.http_params)
@@ -83,7 +89,9 @@ class AbstractScraper:
 
     def search_cached(self, search_filter=None, skip=None):
         key = hash((search_filter, skip))
-        if key not in self.search_cache:
+        cached = key in self.search_cache
+        self._count_cache_requests('search', int(cached), int(not cached))
+        if not cached:
             self.search_cache[key] = (self.search(search_filter, skip), self.has_more)
         res, self.has_more = self.search_cache[key]
         return res
@@ -97,7 +105,8 @@ class AbstractScraper:
         cached_details = self.details_cache.keys()
         not_cached_ids = [_id for _id in media_ids if _id not in cached_details]
         results = dict((_id, self.details_cache[_id]) for _id in media_ids if _id in cached_details)
-        with Timer(logger=self.log, name="Bulk fetching"):
+        self._count_cache_requests('details', len(results), len(not_cached_ids))
+        with Span(logger=self.log, name="Bulk fetching details", cat='scraper', args={'count': len(not_cached_ids)}):
             try:
                 with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
                     futures = [executor.submit(self.get_details, _id) for _id in not_cached_ids]
@@ -111,6 +120,14 @@ class AbstractScraper:
                 raise ScraperError(32000, "Timeout while fetching URLs", cause=e)
         return results
 
+    @staticmethod
+    def _count_cache_requests(cache, hits, misses):
+        counter = metrics.counter('scraper_cache_requests_total', "Scraper cache lookups")
+        if hits:
+            counter.inc(hits, cache=cache, result='hit')
+        if misses:
+            counter.inc(misses, cache=cache, result='miss')
+
     def get_details_cached(self, media_id):
         """
         :rtype : Details
@@ -126,7 +143,8 @@ class AbstractScraper:
         cached_folders = self.folders_cache.keys()
         not_cached_ids = [_id for _id in media_ids if _id not in cached_folders]
         results = dict((_id, self.folders_cache[_id]) for _id in media_ids if _id in cached_folders)
-        with Timer(logger=self.log, name="Bulk fetching"):
+        self._count_cache_requests('folders', len(results), len(not_cached_ids))
+        with Span(logger=self.log, name="Bulk fetching folders", cat='scraper', args={'count': len(not_cached_ids)}):
             try:
                 with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
                     folder_futures = dict((executor.submit(self.get_folders, _id), _id) for _id in not_cached_ids)
@@ -146,7 +164,7 @@ class AbstractScraper:
                     for future in as_completed(files_futures, self.timeout):
                         result = future.result()
                         _id, i = files_futures[future]
-                        results[_id][i].files.extend(result)
+                        results[_id][i] = results[_id][i]._replace(files=tuple(result))
                         self.folders_cache[_id] = results[_id]
                         if _id in self.persistent_ids:
                             self.folders_cache.protect_item(_id)
@@ -205,7 +223,7 @@ class OkinoScraper(AbstractScraper):
         if search_filter:
             self.log.info('Using search filter: %s', search_filter)
 
-        with Timer(logger=self.log, name='Fetching URL'):
+        with Span(logger=self.log, name='Fetching URL', cat='scraper', args={'url': url}):
             html = self.fetch_page(url)
 
         if self.http_response.redirected_to:
@@ -215,7 +233,7 @@ class OkinoScraper(AbstractScraper):
             else:
                 raise ScraperError(32002, "Malformed answer (invalid redirect)")
         results = []
-        with Timer(logger=self.log, name='Parsing'):
+        with Span(logger=self.log, name='Parsing', cat='scraper'):
             document = HtmlDocument.from_string(html)
             self.has_more = False
             grid_no_message = document.find('div', {'class': 'grid_no_message'})
@@ -272,8 +290,7 @@ class OkinoScraper(AbstractScraper):
                         if not genre:
                             self.log.warn('Unknown genre: %s', name)
                             self.log.warn('State: %r', self.extract_state(url))
-                            genre = Genre.OTHER
-                            genre.localized_title = name
+                            genre = UnknownAttribute(Genre.OTHER, name)
                             warnings += 1
                         genres.append(genre)
 
@@ -284,8 +301,7 @@ class OkinoScraper(AbstractScraper):
                         if not language:
                             self.log.warn('Unknown language: %s', name)
                             self.log.warn('State: %r', self.extract_state(url))
-                            language = Language.OTHER
-                            language.localized_title = name
+                            language = UnknownAttribute(Language.OTHER, name)
                             warnings += 1
                         languages.append(language)
 
@@ -296,13 +312,13 @@ class OkinoScraper(AbstractScraper):
                         if not country:
                             self.log.warn('Unknown country: %s', name)
                             self.log.warn('State: %r', self.extract_state(url))
-                            country = Country.OTHER
-                            country.localized_title = name
+                            country = UnknownAttribute(Country.OTHER, name)
                             warnings += 1
                         countries.append(country)
 
-                    media = Media(media_id, title, original_title, added_date, flag, quality, genres, languages,
-                                  countries, start_year, end_year, continuing, rating, user_rating)
+                    media = Media(media_id, title, original_title, added_date, flag, tuple(quality), tuple(genres),
+                                  tuple(languages), tuple(countries), start_year, end_year, continuing, rating,
+                                  user_rating)
 
                     self.log.debug(repr(media).decode("unicode-escape"))
                     results.append(media)
@@ -311,13 +327,14 @@ class OkinoScraper(AbstractScraper):
                     warnings += 1
 
             self.log.info("Found %d result(s), %d warning(s).", len(results), warnings)
+            self._observe_warnings('search', warnings)
 
         return results
 
     def _parse_details(self, html, media_id):
         details = None
         warnings = 0
-        with Timer(logger=self.log, name='Parsing'):
+        with Span(logger=self.log, name='Parsing', cat='scraper'):
             document = HtmlDocument.from_string(html)
             title_h1 = document.find('H1', {'class': 'movie_title'})
             if not title_h1:
@@ -364,8 +381,7 @@ class OkinoScraper(AbstractScraper):
                             if not country:
                                 self.log.warn('Unknown country: %s', name)
                                 self.log.warn('Url: %s', url)
-                                country = Country.OTHER
-                                country.localized_title = name
+                                country = UnknownAttribute(Country.OTHER, name)
                                 warnings += 1
                             countries.append(country)
                     elif label == 'Год':
@@ -392,8 +408,7 @@ class OkinoScraper(AbstractScraper):
                         mpaa_rating = MPAA.find(mpaa_title)
                         if not mpaa_rating:
                             self.log.warn('Unknown MPAA rating: %s', mpaa_title)
-                            mpaa_rating = MPAA.OTHER
-                            mpaa_rating.localized_title = mpaa_title
+                            mpaa_rating = UnknownAttribute(MPAA.OTHER, mpaa_title)
                             warnings += 1
                     elif label == 'Ключевые слова':
                         keywords = description_para.find('a').strings
@@ -405,8 +420,7 @@ class OkinoScraper(AbstractScraper):
                             if not genre:
                                 self.log.warn('Unknown genre: %s', name)
                                 self.log.warn('Url: %s', url)
-                                genre = Genre.OTHER
-                                genre.localized_title = name
+                                genre = UnknownAttribute(Genre.OTHER, name)
                                 warnings += 1
                             genres.append(genre)
                     elif label == 'Описание':
@@ -450,10 +464,12 @@ class OkinoScraper(AbstractScraper):
             if poster_href:
                 poster = poster_href
 
-            details = Details(title, original_title, countries, start_year, world_release, russian_release, duration,
-                              studios, mpaa_rating, keywords, genres, plot, directors, writers, producers, actors,
-                              ratings, votes, poster, media_id, section, continuing, end_year)
+            details = Details(title, original_title, tuple(countries), start_year, world_release, russian_release,
+                              duration, tuple(studios), mpaa_rating, tuple(keywords), tuple(genres), plot,
+                              tuple(directors), tuple(writers), tuple(producers), tuple(actors), ratings, votes,
+                              poster, media_id, section, continuing, end_year)
         self.log.info("Got details successfully, %d warning(s)." % warnings)
+        self._observe_warnings('details', warnings)
         self.log.debug(repr(details).decode("unicode-escape"))
 
         return details
@@ -466,7 +482,7 @@ class OkinoScraper(AbstractScraper):
         """
         url = "%s/film/details/%d" % (self.base_url, media_id)
 
-        with Timer(logger=self.log, name='Fetching URL'):
+        with Span(logger=self.log, name='Fetching URL', cat='scraper', args={'url': url}):
             html = self.fetch_page(url)
 
         return self._parse_details(html, media_id)
@@ -479,11 +495,11 @@ class OkinoScraper(AbstractScraper):
         """
         url = "%s/film/content/%d" % (self.base_url, media_id)
 
-        with Timer(logger=self.log, name='Fetching URL'):
+        with Span(logger=self.log, name='Fetching URL', cat='scraper', args={'url': url}):
             html = self.fetch_page(url)
         folders = []
         warnings = 0
-        with Timer(logger=self.log, name='Parsing folders'):
+        with Span(logger=self.log, name='Parsing folders', cat='scraper'):
             document = HtmlDocument.from_string(html)
             blocks = document.find("div", {'class': 'block_files.*?'})
             if not blocks:
@@ -526,8 +542,7 @@ class OkinoScraper(AbstractScraper):
                                     language = Language.find(lang)
                                     if not language:
                                         self.log.warn('Unknown audio language: %s', lang)
-                                        language = Language.OTHER
-                                        language.localized_title = lang
+                                        language = UnknownAttribute(Language.OTHER, lang)
                                         warnings += 1
                                     languages.append(language)
                         elif name == 'Качество звука':
@@ -535,16 +550,14 @@ class OkinoScraper(AbstractScraper):
                             audio_quality = AudioQuality.find(val)
                             if not audio_quality:
                                 self.log.warn('Unknown audio quality: %s', val)
-                                audio_quality = AudioQuality.UNKNOWN
-                                audio_quality.localized_title = val
+                                audio_quality = UnknownAttribute(AudioQuality.UNKNOWN, val)
                                 warnings += 1
                         elif name == 'Качество изображения':
                             val = p.after_text
                             video_quality = VideoQuality.find(val)
                             if not video_quality:
                                 self.log.warn('Unknown video quality: %s', val)
-                                video_quality = VideoQuality.UNKNOWN
-                                video_quality.localized_title = val
+                                video_quality = UnknownAttribute(VideoQuality.UNKNOWN, val)
                                 warnings += 1
                         elif name == 'Встроенные субтитры':
                             titles = p.find('a').attrs('title')
@@ -554,8 +567,7 @@ class OkinoScraper(AbstractScraper):
                                     language = Language.find(lang)
                                     if not language:
                                         self.log.warn('Unknown embedded subtitles language: %s', lang)
-                                        language = Language.OTHER
-                                        language.localized_title = lang
+                                        language = UnknownAttribute(Language.OTHER, lang)
                                         warnings += 1
                                     embedded_subtitles.append(language)
                         elif name == 'Внешние субтитры':
@@ -566,8 +578,7 @@ class OkinoScraper(AbstractScraper):
                                     language = Language.find(lang)
                                     if not language:
                                         self.log.warn('Unknown external subtitles language: %s', lang)
-                                        language = Language.OTHER
-                                        language.localized_title = lang
+                                        language = UnknownAttribute(Language.OTHER, lang)
                                         warnings += 1
                                     external_subtitles.append(language)
                         elif name == 'Размер файлов':
@@ -589,8 +600,9 @@ class OkinoScraper(AbstractScraper):
                     quality = Quality(fmt, video_quality, audio_quality)
                     files_tbl = document.find('table', {'id': 'files_tbl'})
                     files = self._parse_files(files_tbl, media_id, folder_id) if files_tbl else []
-                    folder = Folder(folder_id, media_id, title, flag, link, quality, languages, fmt,
-                                    embedded_subtitles, external_subtitles, duration, size, files)
+                    folder = Folder(folder_id, media_id, title, flag, link, quality, tuple(languages), fmt,
+                                    tuple(embedded_subtitles), tuple(external_subtitles), duration, size,
+                                    tuple(files))
                     self.log.debug(repr(folder).decode("unicode-escape"))
                     folders.append(folder)
                 except Exception as e:
@@ -598,6 +610,7 @@ class OkinoScraper(AbstractScraper):
                     warnings += 1
 
             self.log.info("Got %d folder(s) successfully, %d warning(s)." % (len(folders), warnings))
+            self._observe_warnings('folders', warnings)
         return folders
 
     def get_files(self, media_id, folder_id):
@@ -609,7 +622,7 @@ class OkinoScraper(AbstractScraper):
         """
         url = "%s/film/filelist/%d?fid=%d" % (self.base_url, media_id, folder_id)
 
-        with Timer(logger=self.log, name='Fetching URL'):
+        with Span(logger=self.log, name='Fetching URL', cat='scraper', args={'url': url}):
             html = self.fetch_page(url)
 
         document = HtmlDocument.from_string(html)
@@ -619,7 +632,7 @@ class OkinoScraper(AbstractScraper):
     def _parse_files(self, doc, media_id, folder_id):
         files = []
         warnings = 0
-        with Timer(logger=self.log, name='Parsing files'):
+        with Span(logger=self.log, name='Parsing files', cat='scraper'):
             rows = doc.find('tr')[1:]
             if not rows:
                 self.log.warn("No files found.")
@@ -650,8 +663,7 @@ class OkinoScraper(AbstractScraper):
                         language = Language.find(lang)
                         if not language:
                             self.log.warn('Unknown subtitles language: %s', lang)
-                            language = Language.OTHER
-                            language.localized_title = lang
+                            language = UnknownAttribute(Language.OTHER, lang)
                             warnings += 1
                         subtitles.append(language)
                     props = row.find('td', {'class': 'videoprop'}).find('ul')
@@ -674,10 +686,10 @@ class OkinoScraper(AbstractScraper):
                                 continue
                             width, height = resolution.split("x")
                             kbps = float(kbps.split(" ")[0])
-                            video_streams.append(VideoStreamInfo(width, height, codec, kbps))
+                            video_streams.append(VideoStreamInfo(int(width), int(height), codec, kbps))
                         for li in props[1].find('li'):
                             lang_title = li.find('img').attr('title')
-                            language = Language.find(lang_title.upper()) if lang_title else None
+                            language = Language.find(lang_title, ignore_case=True) if lang_title else None
                             li = li.text
                             parts = re.split(",\s*", li)
                             if len(parts) != 3:
@@ -688,14 +700,15 @@ class OkinoScraper(AbstractScraper):
                             channels = int(parts[1]) or None
                             kbps = float(parts[2].split(" ")[0])
                             audio_streams.append(AudioStreamInfo(language, codec, kbps, channels))
-                    f = File(file_id, media_id, folder_id, title, flag, link, file_fmt, subtitles, duration, size,
-                             video_streams, audio_streams)
+                    f = File(file_id, media_id, folder_id, title, flag, link, file_fmt, tuple(subtitles), duration,
+                             size, tuple(video_streams), tuple(audio_streams))
                     self.log.debug(repr(f).decode("unicode-escape"))
                     files.append(f)
                 except Exception as e:
                     self.log.exception(e)
                     warnings += 1
         self.log.info("Got %d file(s) successfully, %d warning(s)." % (len(files), warnings))
+        self._observe_warnings('files', warnings)
         return files
 
     @staticmethod
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+import os
+import json
+import time
 
 from collections import namedtuple
 
@@ -106,3 +109,38 @@ class HistoryItems:
 
     def clear(self):
         del self.items[:]
+
+
+class MetricsStore:
+    """
+    Collects metrics of short-lived plugin processes for the service: plugin pushes recorded metrics as
+    a pending snapshot, service merges pending snapshots into its registry and saves totals to a JSON file.
+    """
+    def __init__(self, storage, registry, path):
+        """
+        :type storage: dict
+        :type registry: util.metrics.MetricsRegistry
+        """
+        self.storage = storage
+        self.registry = registry
+        self.path = path
+
+    def push(self):
+        snapshot = self.registry.reset()
+        if snapshot:
+            self.storage['%d-%f' % (os.getpid(), time.time())] = snapshot
+
+    def collect(self):
+        for key in self.storage.keys():
+            snapshot = self.storage.pop(key, None)
+            if snapshot:
+                self.registry.merge(snapshot)
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.registry.merge(json.load(f))
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump(self.registry.snapshot(), f)
@@ -4,6 +4,8 @@ import urllib2
 import os
 import urlparse
 import urllib
+import hashlib
+import base64
 
 from collections import namedtuple
 from datetime import datetime
@@ -12,8 +14,9 @@ from contextlib import closing
 from okino.player import AbstractPlayer
 from okino.common import LocalizedEnum, LocalizedError
 from util.httpclient import HttpClient
-from util.bencode import bdecode, BTFailure
+from util.bencode import bdecode, bencode, BTFailure
 from util.encoding import ensure_str
+from util.metrics import default_registry as metrics
 
 
 __all__ = ['Torrent', 'TorrentStatus', 'TorrentFile', 'TorrentInfo', 'TorrentStream',
@@ -64,12 +67,27 @@ class TorrentClient:
     def list(self):
         raise NotImplementedError()
 
+    def list_changed(self):
+        """
+        Return torrents changed since previous call and IDs of removed ones (first call returns all torrents)
+
+        :rtype : (list[TorrentInfo], list)
+        """
+        return self.list(), []
+
     def remove(self, torrent_id):
         """
         :type torrent_id: int
         """
         raise NotImplementedError()
 
+    def remove_many(self, torrent_ids):
+        """
+        :type torrent_ids: list
+        """
+        for torrent_id in torrent_ids:
+            self.remove(torrent_id)
+
     def add(self, torrent, download_dir):
         """
         :type download_dir: str
@@ -77,9 +95,18 @@ class TorrentClient:
         """
         raise NotImplementedError()
 
+    def add_many(self, torrents, download_dir):
+        """
+        :type download_dir: str
+        :type torrents: list[Torrent]
+        """
+        return [self.add(torrent, download_dir) for torrent in torrents]
+
 
 class TorrentStream:
     saved_files_needed = False
+    # paths of the files (in the temporary folder) used by the last play() call
+    played_paths = []
 
     def __init__(self):
         pass
@@ -99,6 +126,11 @@ class TorrentStream:
         """
         raise NotImplementedError()
 
+    @staticmethod
+    def _observe_buffering(stream, seconds):
+        metrics.histogram('torrent_buffering_seconds', "Time from starting the stream to playback",
+                          buckets=(1, 2, 5, 10, 20, 30, 60, 120, 300)).observe(seconds, stream=stream)
+
 
 class TorrentError(LocalizedError):
     pass
@@ -209,6 +241,19 @@ class Torrent:
     def info(self):
         return self.decoded['info']
 
+    @property
+    def info_hash(self):
+        if self.has_url() and self.is_magnet():
+            query = urlparse.parse_qs(self.url.split('?', 1)[-1])
+            for xt in query.get('xt', []):
+                if xt.startswith('urn:btih:'):
+                    info_hash = xt[9:]
+                    if len(info_hash) == 32:
+                        info_hash = base64.b32decode(info_hash.upper()).encode('hex')
+                    return info_hash.lower()
+            raise TorrentError(32013, "Can't get torrent data for magnet link (%s)", self.url)
+        return hashlib.sha1(bencode(self.info)).hexdigest()
+
     @property
     def creation_date(self):
         return datetime.fromtimestamp(self.decoded['creation date']) if 'creation date' in self.decoded else None
@@ -224,3 +269,13 @@ class Torrent:
         else:
             return [TorrentFile(0, self.info['name'], self.info['length'], self.info['md5sum']
                     if 'm5sum' in self.info else None)]
+
+    def next_file_index(self, index):
+        """
+        Index of the file following the one with given index, None for the last or an unknown one
+        """
+        indexes = [f.index for f in self.files]
+        if index not in indexes:
+            return None
+        pos = indexes.index(index) + 1
+        return indexes[pos] if pos < len(indexes) else None
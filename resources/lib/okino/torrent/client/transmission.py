@@ -23,6 +23,13 @@ class TransmissionClient(TorrentClient):
         5: TorrentStatus.SEED_PENDING,
         6: TorrentStatus.SEEDING
     }
+    FIELDS = [
+        'id', 'status', 'name', 'totalSize', 'sizeWhenDone', 'leftUntilDone', 'downloadedEver',
+        'uploadedEver', 'uploadRatio', 'rateUpload', 'rateDownload', 'eta', 'peersConnected',
+        'peersFrom', 'addedDate', 'doneDate', 'downloadDir', 'peersConnected',
+        'peersGettingFromUs', 'peersSendingToUs'
+    ]
+    MAX_RETRIES = 3
 
     def __init__(self, login=None, password=None, host='127.0.0.1', port=9091,
                  path='/transmission', log=None, timeout=5):
@@ -41,43 +48,52 @@ class TransmissionClient(TorrentClient):
         self.url += path
         self.http = HttpClient(log=self.log, timeout=timeout)
         self.token = '0'
+        self._listed = False
 
     def list(self):
         obj = self.action({
             'method': 'torrent-get',
             'arguments': {
-                'fields': [
-                    'id', 'status', 'name', 'totalSize', 'sizeWhenDone', 'leftUntilDone', 'downloadedEver',
-                    'uploadedEver', 'uploadRatio', 'rateUpload', 'rateDownload', 'eta', 'peersConnected',
-                    'peersFrom', 'addedDate', 'doneDate', 'downloadDir', 'peersConnected',
-                    'peersGettingFromUs', 'peersSendingToUs'
-                ]
+                'fields': self.FIELDS
             }
         })
-        res = []
-        for r in obj['arguments'].get('torrents', []):
-            res.append(TorrentInfo(
-                torrent_id=str(r['id']),
-                status=self.get_status(r['status']),
-                name=r['name'],
-                size=r['totalSize'],
-                progress=0 if not r['sizeWhenDone'] else int(100.0 * float(r['sizeWhenDone'] - r['leftUntilDone']) /
-                                                             float(r['sizeWhenDone'])),
-                downloaded=r['downloadedEver'],
-                uploaded=r['uploadedEver'],
-                upload_rate=r['rateUpload'],
-                download_rate=r['rateDownload'],
-                ratio=float(r['uploadRatio']),
-                eta=r['eta'],
-                peers=r['peersConnected'],
-                seeds=r['peersSendingToUs'],
-                leeches=r['peersGettingFromUs'],
-                added=r['addedDate'],
-                finished=r['doneDate'],
-                download_dir=r['downloadDir']
-            ))
-
-        return res
+        self._listed = True
+        return [self._torrent_info(r) for r in obj['arguments'].get('torrents', [])]
+
+    def list_changed(self):
+        if not self._listed:
+            return self.list(), []
+        obj = self.action({
+            'method': 'torrent-get',
+            'arguments': {
+                'ids': 'recently-active',
+                'fields': self.FIELDS
+            }
+        })
+        args = obj['arguments']
+        return [self._torrent_info(r) for r in args.get('torrents', [])], [str(i) for i in args.get('removed', [])]
+
+    def _torrent_info(self, r):
+        return TorrentInfo(
+            torrent_id=str(r['id']),
+            status=self.get_status(r['status']),
+            name=r['name'],
+            size=r['totalSize'],
+            progress=0 if not r['sizeWhenDone'] else int(100.0 * float(r['sizeWhenDone'] - r['leftUntilDone']) /
+                                                         float(r['sizeWhenDone'])),
+            downloaded=r['downloadedEver'],
+            uploaded=r['uploadedEver'],
+            upload_rate=r['rateUpload'],
+            download_rate=r['rateDownload'],
+            ratio=float(r['uploadRatio']),
+            eta=r['eta'],
+            peers=r['peersConnected'],
+            seeds=r['peersSendingToUs'],
+            leeches=r['peersGettingFromUs'],
+            added=r['addedDate'],
+            finished=r['doneDate'],
+            download_dir=r['downloadDir']
+        )
 
     def add(self, torrent, download_dir, paused=False):
         """
@@ -113,23 +129,23 @@ class TransmissionClient(TorrentClient):
                 'delete-local-data': delete_local_data
             }})
 
+    def remove_many(self, torrent_ids, delete_local_data=False):
+        return self.remove(list(torrent_ids), delete_local_data)
+
+    def add_many(self, torrents, download_dir, paused=False):
+        return [self.add(torrent, download_dir, paused) for torrent in torrents]
+
     def action(self, request):
         json_obj = json.dumps(request)
+        auth = {'auth_username': self.login, 'auth_password': self.password} if self.login else {}
 
-        while True:
+        for _ in range(self.MAX_RETRIES):
             try:
-                if self.login:
-                    response = self.http.fetch(self.url+'rpc/',
-                                               method='POST',
-                                               params=json_obj,
-                                               headers={'x-transmission-session-id': self.token},
-                                               auth_username=self.login,
-                                               auth_password=self.password)
-                else:
-                    response = self.http.fetch(self.url+'rpc/',
-                                               method='POST',
-                                               params=json_obj,
-                                               headers={'x-transmission-session-id': self.token})
+                response = self.http.fetch(self.url+'rpc/',
+                                           method='POST',
+                                           params=json_obj,
+                                           headers={'x-transmission-session-id': self.token},
+                                           **auth)
                 try:
                     return json.loads(response.body)
                 except ValueError, e:
@@ -145,6 +161,7 @@ class TransmissionClient(TorrentClient):
                         self.get_token(e.headers)
                         continue
                 raise TransmissionError(32011, "Can't connect to Transmission", cause=e, check_settings=True)
+        raise TransmissionError(32032, "Transmission keeps rejecting the session", check_settings=True)
 
     def get_auth(self):
         try:
@@ -45,33 +45,41 @@ class UTorrentClient(TorrentClient):
             'cookie': re.compile('GUID=([^;]+);'),
             'token': re.compile("<div[^>]+id='token'[^>]*>([^<]+)</div>")
         }
+        self._session = None
+        self._cid = None
 
     def list(self):
         obj = self.action(list=1)
-
-        res = []
-        for r in obj.get('torrents', []):
-            res.append(TorrentInfo(
-                torrent_id=r[0],
-                status=self.get_status(r[1], r[4]/10),
-                name=r[2],
-                size=r[3],
-                progress=r[4]/10,
-                downloaded=r[5],
-                uploaded=r[6],
-                ratio=r[7],
-                upload_rate=r[8],
-                download_rate=r[9],
-                eta=r[10],
-                peers=r[12] + r[14],
-                leeches=r[12],
-                seeds=r[14],
-                added=r[23],
-                finished=r[24],
-                download_dir=r[26]
-            ))
-
-        return res
+        self._cid = obj.get('torrentc')
+        return [self._torrent_info(r) for r in obj.get('torrents', [])]
+
+    def list_changed(self):
+        if self._cid is None:
+            return self.list(), []
+        obj = self.action(list=1, cid=self._cid)
+        self._cid = obj.get('torrentc')
+        return [self._torrent_info(r) for r in obj.get('torrentp', [])], obj.get('torrentm', [])
+
+    def _torrent_info(self, r):
+        return TorrentInfo(
+            torrent_id=r[0],
+            status=self.get_status(r[1], r[4]/10),
+            name=r[2],
+            size=r[3],
+            progress=r[4]/10,
+            downloaded=r[5],
+            uploaded=r[6],
+            ratio=r[7],
+            upload_rate=r[8],
+            download_rate=r[9],
+            eta=r[10],
+            peers=r[12] + r[14],
+            leeches=r[12],
+            seeds=r[14],
+            added=r[23],
+            finished=r[24],
+            download_dir=r[26]
+        )
 
     def set_download_dir(self, download_dir):
         self.log.info("Setting download dir to %s", download_dir)
@@ -92,37 +100,75 @@ class UTorrentClient(TorrentClient):
         self.log.info("Removing torrent %s from queue", torrent_id)
         return self.action(action='remove', hash=torrent_id)
 
-    def _add(self, download_dir, **query):
+    def remove_many(self, torrent_ids):
+        torrent_ids = list(torrent_ids)
+        self.log.info("Removing %d torrent(s) from queue", len(torrent_ids))
+        return self.action(action='remove', hash=torrent_ids)
+
+    def _add(self, download_dir, queries):
         settings = self.get_settings()
         old_dir = settings.get('dir_active_download', None)
         download_dir = os.path.abspath(download_dir)
         self.set_download_dir(download_dir)
         try:
-            return self.action(**query)
+            return [self.action(**query) for query in queries]
         except UTorrentError, e:
             raise UTorrentError(32008, "Can't add torrent", cause=e)
         finally:
             if old_dir:
                 self.set_download_dir(old_dir)
 
-    def add(self, torrent, download_dir):
+    def _add_query(self, torrent):
         """
         :type torrent: Torrent
         """
         if torrent.has_data() or torrent.has_file_name():
             self.log.info("Adding torrent from data")
-            return self._add(download_dir, action='add-file', upload_files={'name': 'torrent_file',
-                                                                            'content-type': 'application/x-bittorrent',
-                                                                            'body': torrent.data})
+            return dict(action='add-file', upload_files={'name': 'torrent_file',
+                                                         'content-type': 'application/x-bittorrent',
+                                                         'body': torrent.data})
         elif torrent.has_url():
             self.log.info("Adding torrent from url (%s)", torrent.url)
-            return self._add(download_dir, action='add-url', s=torrent.url)
+            return dict(action='add-url', s=torrent.url)
+
+    def add(self, torrent, download_dir):
+        """
+        :type torrent: Torrent
+        """
+        res = self.add_many([torrent], download_dir)
+        return res[0] if res else None
+
+    def add_many(self, torrents, download_dir):
+        """
+        Add several torrents switching uTorrent download dir only once
+
+        :type torrents: list[Torrent]
+        """
+        queries = filter(None, [self._add_query(torrent) for torrent in torrents])
+        if not queries:
+            return []
+        return self._add(download_dir, queries)
 
     def action(self, **query):
-        cookie, token = self.get_token()
-        query['token'] = token
+        try:
+            return self._action(query)
+        except UTorrentError, e:
+            # session expired?
+            if e.cause and isinstance(e.cause[0], urllib2.HTTPError) and e.cause[0].code in (400, 401) \
+                    and self._session:
+                self._session = None
+                return self._action(query)
+            raise e
+
+    def _action(self, query):
+        if not self._session:
+            self._session = self.get_token()
+        cookie, token = self._session
+        query = dict(query, token=token)
         upload_files = query.pop('upload_files', None)
-        req = HttpRequest(self.url + '?' + urllib.urlencode(query), headers={'Cookie': cookie},
+        params = [(k, v) for k, values in query.iteritems()
+                  for v in (values if isinstance(values, list) else [values])]
+        req = HttpRequest(self.url + '?' + urllib.urlencode(params), headers={'Cookie': cookie},
                           auth_username=self.login, auth_password=self.password, upload_files=upload_files)
         try:
             response = self.http.fetch(req)
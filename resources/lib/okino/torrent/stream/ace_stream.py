@@ -4,11 +4,11 @@ import logging
 import time
 
 from okino.torrent import *
-from okino.common import abort_requested, sleep
+from okino.common import abort_requested, sleep, profiling
 from okino.progress import AbstractTorrentTransferProgress, DummyTorrentTransferProgress
 from okino.player import AbstractPlayer
 from acestream import Engine, Error, State, Status
-from contextlib import closing, nested
+from contextlib import closing, nested, contextmanager
 
 
 class AceStreamError(TorrentStreamError):
@@ -22,11 +22,13 @@ class AbortError(Exception):
 class AceStream(TorrentStream):
     POLL_DELAY = 0.5
 
-    def __init__(self, engine, buffering_progress=None, playing_progress=None, log=None, playback_start_timeout=5):
+    def __init__(self, engine, buffering_progress=None, playing_progress=None, log=None, playback_start_timeout=5,
+                 keep_engine_running=False):
         """
         :type engine: Engine
         :type playing_progress: AbstractTorrentTransferProgress
         :type buffering_progress: AbstractTorrentTransferProgress
+        :param keep_engine_running: Don't shut down AceStream engine after playback, so next play starts faster
         """
         TorrentStream.__init__(self)
         self.playing_progress = playing_progress or DummyTorrentTransferProgress()
@@ -34,6 +36,7 @@ class AceStream(TorrentStream):
         self.playback_start_timeout = playback_start_timeout
         self.log = log or logging.getLogger(__name__)
         self.engine = engine
+        self.keep_engine_running = keep_engine_running
         self._playing_aborted = False
 
     @staticmethod
@@ -89,7 +92,8 @@ class AceStream(TorrentStream):
 
         list_item.setdefault('label', torrent.name)
         try:
-            with closing(self.engine) as engine:
+            with self._engine_session() as engine:
+                buffering_start = time.time()
                 with closing(self.buffering_progress) as progress:
                     progress.open()
                     self.log.info("Starting AceStream engine...")
@@ -112,6 +116,7 @@ class AceStream(TorrentStream):
                         status = engine.get_status()
                         if status.url:
                             list_item['path'] = status.url
+                            self._observe_buffering('acestream', time.time() - buffering_start)
                             break
                         state = self._convert_state(status)
                         update_status = [state, status.download, status.down_speed, status.up_speed,
@@ -126,7 +131,8 @@ class AceStream(TorrentStream):
                                 player.attached(player.PLAYBACK_PAUSED, self.engine.on_pause),
                                 player.attached(player.PLAYBACK_RESUMED, self.engine.on_resume),
                                 player.attached(player.PLAYBACK_STOPPED, self.engine.on_stop),
-                                player.attached(player.PLAYBACK_SEEK, self.engine.on_seek)):
+                                player.attached(player.PLAYBACK_SEEK, self.engine.on_seek),
+                                profiling('playback')):
                         self.log.info("Starting playback...")
                         player.play(list_item)
                         progress.name = torrent.name
@@ -151,6 +157,19 @@ class AceStream(TorrentStream):
             return [self.engine.saved_files[file_id]]
         return []
 
+    @contextmanager
+    def _engine_session(self):
+        try:
+            yield self.engine
+        finally:
+            if self.keep_engine_running:
+                self.log.info("Leaving AceStream engine running")
+                if self.engine.sink and self.engine.state > 0:
+                    self.engine.on_stop()
+                self.engine.shutdown()
+            else:
+                self.engine.close()
+
     def _poll_engine(self, delay):
         sleep(int(delay*1000))
         if self._aborted():
@@ -4,28 +4,136 @@ import logging
 import time
 import hashlib
 import os
+import socket
+import threading
+import urllib2
 
 from torrent2http import Error, State, Engine, MediaType
-from okino.common import abort_requested, sleep
+from okino.common import abort_requested, sleep, profiling
 from okino.torrent import *
 from okino.player import AbstractPlayer
 from okino.progress import AbstractTorrentTransferProgress, DummyTorrentTransferProgress
-from contextlib import closing, nested
+from contextlib import closing, nested, contextmanager
 
 
 class Torrent2HttpStreamError(TorrentStreamError):
     pass
 
 
+class Torrent2HttpMonitor(object):
+    """
+    Polls torrent2http for session and file statuses. Polling is fast while torrent is starting up
+    and is backed off exponentially during steady playback (see poll_due()). Files are listed only until
+    the engine knows them, afterwards only the status of the played file is fetched along with the session
+    status. Statuses are served from the last poll.
+    """
+    STARTUP_DELAY = 250
+    MIN_DELAY = 500
+    MAX_DELAY = 8000
+    BACKOFF_FACTOR = 2
+
+    def __init__(self, engine, startup_delay=STARTUP_DELAY, min_delay=MIN_DELAY, max_delay=MAX_DELAY,
+                 backoff_factor=BACKOFF_FACTOR):
+        """
+        :type engine: Engine
+        """
+        self.engine = engine
+        self.startup_delay = startup_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.backoff_factor = backoff_factor
+        self.status = None
+        self.files = None
+        self._file_statuses = {}
+        self._delay = min_delay
+        self._next_poll = 0
+
+    def poll(self, file_id=None, with_files=True):
+        """
+        Fetch session status and status of the file with given index or, until file is chosen, list of files
+        """
+        self.status = self.engine.status()
+        self.engine.check_torrent_error(self.status)
+        if with_files:
+            if file_id is not None:
+                self._file_statuses[file_id] = self.engine.file_status(file_id)
+            elif not self.files:
+                self.files = self.engine.list()
+        return self.status
+
+    def list(self, media_types=None):
+        if self.files is None:
+            return None
+        if media_types is None:
+            return self.files
+        return [f for f in self.files if f.media_type in media_types]
+
+    def file_status(self, file_id):
+        return self._file_statuses.get(file_id)
+
+    def wait_startup(self):
+        sleep(self.startup_delay)
+
+    def reset(self):
+        self._delay = self.min_delay
+        self._next_poll = 0
+
+    def poll_due(self):
+        now = time.time()
+        if now < self._next_poll:
+            return False
+        self._next_poll = now + self._delay / 1000.0
+        self._delay = min(self._delay * self.backoff_factor, self.max_delay)
+        return True
+
+
+class Torrent2HttpPrebufferThread(threading.Thread):
+    """
+    Reads the beginning of a file served by torrent2http, so the engine downloads its first pieces in advance
+    """
+    BUFFER_SIZE = 1024 * 128
+
+    def __init__(self, file_id, url, size, log=None):
+        super(Torrent2HttpPrebufferThread, self).__init__()
+        self.daemon = True
+        self.file_id = file_id
+        self.url = url
+        self.size = size
+        self.log = log or logging.getLogger(__name__)
+        self._stopped = threading.Event()
+
+    def run(self):
+        read = 0
+        try:
+            with closing(urllib2.urlopen(self.url, timeout=30)) as conn:
+                while read < self.size and not self._stopped.is_set():
+                    buf = conn.read(self.BUFFER_SIZE)
+                    if not buf:
+                        break
+                    read += len(buf)
+        except (urllib2.URLError, socket.error) as e:
+            self.log.info("Prebuffering of %s interrupted: %s", self.url, e)
+        self.log.info("Prebuffered %d byte(s) of %s", read, self.url)
+
+    def stop(self):
+        self._stopped.set()
+
+
 class Torrent2HttpStream(TorrentStream):
     SLEEP_DELAY = 500
+    IDLE_SLEEP_DELAY = 1000
+    PREBUFFER_NEXT_BYTES = 20 * 1024 * 1024
 
     def __init__(self, engine, buffering_progress=None, playing_progress=None, pre_buffer_bytes=0, log=None,
-                 playback_start_timeout=5):
+                 playback_start_timeout=5, warm_idle_timeout=0, warm_storage=None, prebuffer_next=False):
         """
         :type engine: Engine
         :type playing_progress: AbstractTorrentTransferProgress
         :type buffering_progress: AbstractTorrentTransferProgress
+        :param warm_idle_timeout: Keep engine running for that many seconds after playback (0 to shut down at once)
+        :type warm_storage: dict
+        :param warm_storage: Persistent storage to remember warm engine between plugin invocations
+        :param prebuffer_next: Allow prebuffer() to download next file of the torrent while the current one is playing
         """
         TorrentStream.__init__(self)
         self.engine = engine
@@ -35,7 +143,12 @@ class Torrent2HttpStream(TorrentStream):
         self.playing_progress = playing_progress or DummyTorrentTransferProgress()
         self.pre_buffer_bytes = pre_buffer_bytes
         self.playback_start_timeout = playback_start_timeout
+        self.warm_idle_timeout = warm_idle_timeout
+        self.warm_storage = warm_storage if warm_storage is not None else {}
+        self.prebuffer_next = prebuffer_next
+        self._prebuffer_thread = None
         self._playing_aborted = False
+        self.playing_file_id = None
 
     @staticmethod
     def _convert_engine_error(error):
@@ -85,15 +198,14 @@ class Torrent2HttpStream(TorrentStream):
         """
         :type torrent: Torrent
         """
-        self.engine.uri = torrent.url
         files = []
         try:
-            with closing(self.engine) as t2h:
-                t2h.start()
+            with self._engine_session(torrent, None) as t2h:
+                monitor = Torrent2HttpMonitor(t2h)
                 while not files:
-                    files = t2h.list(media_types=[MediaType.VIDEO])
-                    t2h.check_torrent_error()
-                    sleep(self.SLEEP_DELAY)
+                    monitor.wait_startup()
+                    monitor.poll()
+                    files = monitor.list(media_types=[MediaType.VIDEO])
         except Error as e:
             raise self._convert_engine_error(e)
         return [TorrentFile(path=f.name, length=f.size, md5sum=None, index=f.index) for f in files]
@@ -102,6 +214,111 @@ class Torrent2HttpStream(TorrentStream):
         return abort_requested() or self.buffering_progress.is_cancelled() or \
             self.playing_progress.is_cancelled()
 
+    @contextmanager
+    def _engine_session(self, torrent, file_id):
+        """
+        Starts the engine or attaches to the one left warm after playing the same torrent. On exit the engine
+        is shut down, or in warm mode left running (it exits by itself after warm_idle_timeout of inactivity).
+        """
+        info_hash = torrent.info_hash if self.warm_idle_timeout else None
+        attached = self._attach_warm_engine(info_hash)
+        if not attached:
+            self.log.info("Starting torrent2http engine...")
+            self.engine.uri = torrent.url
+            self.engine.resume_file = self._resume_file(torrent)
+            if info_hash:
+                # a warm engine of another torrent may still be holding the previous port
+                self.engine.bind_port = self._free_port(self.engine.bind_host)
+            self.engine.start(file_id or 0)
+        keep_warm = False
+        try:
+            yield self.engine
+            keep_warm = self.warm_idle_timeout > 0
+        finally:
+            self._stop_prebuffering()
+            self.playing_file_id = None
+            if keep_warm:
+                self.log.info("Keeping torrent2http engine warm for %d second(s)", self.warm_idle_timeout)
+                self.warm_storage['engine'] = {
+                    'info_hash': info_hash,
+                    'host': self.engine.bind_host,
+                    'port': self.engine.bind_port,
+                    'expires': time.time() + self.warm_idle_timeout,
+                }
+            elif attached:
+                # engine process belongs to another invocation, close() can't stop it
+                self._shutdown_warm_engine(self.warm_storage['engine'])
+            else:
+                self.warm_storage.pop('engine', None)
+                self.engine.close()
+
+    @staticmethod
+    def _free_port(host):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.bind((host, 0))
+            return sock.getsockname()[1]
+        finally:
+            sock.close()
+
+    def _resume_file(self, torrent):
+        return os.path.join(self.engine.download_path, hashlib.md5(torrent.url).hexdigest() + ".resume")
+
+    def _attach_warm_engine(self, info_hash):
+        warm = self.warm_storage.get('engine')
+        if not warm:
+            return False
+        if info_hash and warm['info_hash'] == info_hash and warm['expires'] > time.time():
+            bind_address = self.engine.bind_host, self.engine.bind_port
+            self.engine.bind_host, self.engine.bind_port = warm['host'], warm['port']
+            try:
+                self.engine.status()
+                self.log.info("Reusing warm torrent2http engine for torrent %s", info_hash)
+                return True
+            except Error as e:
+                self.log.info("Warm torrent2http engine is not responding (%s)", e)
+                self.engine.bind_host, self.engine.bind_port = bind_address
+        self._shutdown_warm_engine(warm)
+        return False
+
+    def _shutdown_warm_engine(self, warm):
+        self.log.info("Shutting down warm torrent2http engine for torrent %s", warm['info_hash'])
+        self.warm_storage.pop('engine', None)
+        try:
+            urllib2.urlopen("http://%s:%d/shutdown" % (warm['host'], warm['port']), timeout=5).close()
+        except (urllib2.URLError, socket.error):
+            pass
+
+    def prebuffer(self, file_id):
+        """
+        Starts downloading the first pieces of another file of the torrent being played. Does nothing unless
+        prebuffer_next is enabled and a file is playing; repeated calls for the same file are ignored.
+
+        :type file_id: int
+        """
+        if not self.prebuffer_next or self.playing_file_id is None or file_id == self.playing_file_id:
+            return
+        thread = self._prebuffer_thread
+        if thread and thread.file_id == file_id and thread.is_alive():
+            return
+        self._stop_prebuffering()
+        try:
+            file_status = self.engine.file_status(file_id)
+        except Error as e:
+            self.log.warn("Can't prebuffer file #%d: %s", file_id, e)
+            return
+        if not file_status or file_status.download >= file_status.size:
+            return
+        self.log.info("Prebuffering next file: %s", file_status.name)
+        size = min(self.pre_buffer_bytes or self.PREBUFFER_NEXT_BYTES, self.PREBUFFER_NEXT_BYTES)
+        self._prebuffer_thread = Torrent2HttpPrebufferThread(file_id, file_status.url, size, self.log)
+        self._prebuffer_thread.start()
+
+    def _stop_prebuffering(self):
+        if self._prebuffer_thread:
+            self._prebuffer_thread.stop()
+            self._prebuffer_thread = None
+
     def play(self, player, torrent, list_item=None, file_id=None):
         """
         :type list_item: dict
@@ -113,24 +330,20 @@ class Torrent2HttpStream(TorrentStream):
         subtitles = None
 
         try:
-            with closing(self.engine):
-                self.log.info("Starting torrent2http engine...")
-                self.engine.uri = torrent.url
-                resume_file = hashlib.md5(torrent.url).hexdigest() + ".resume"
-                self.engine.resume_file = os.path.join(self.engine.download_path, resume_file)
-                self.engine.start(file_id or 0)
+            with self._engine_session(torrent, file_id):
+                monitor = Torrent2HttpMonitor(self.engine)
                 ready = False
+                buffering_start = time.time()
 
                 if self.pre_buffer_bytes:
                     with closing(self.buffering_progress):
                         self.log.info("Start prebuffering...")
                         self.buffering_progress.open()
                         while not self._aborted():
-                            sleep(self.SLEEP_DELAY)
-                            status = self.engine.status()
-                            self.engine.check_torrent_error(status)
+                            monitor.wait_startup()
+                            status = monitor.poll(file_id)
                             if file_id is None:
-                                files = self.engine.list(media_types=[MediaType.VIDEO])
+                                files = monitor.list(media_types=[MediaType.VIDEO])
                                 if files is None:
                                     continue
                                 if not files:
@@ -138,12 +351,12 @@ class Torrent2HttpStream(TorrentStream):
                                 file_id = files[0].index
                                 file_status = files[0]
                                 self.log.info("Detected video file: %s", file_status)
-                                sub_files = self.engine.list(media_types=[MediaType.SUBTITLES])
+                                sub_files = monitor.list(media_types=[MediaType.SUBTITLES])
                                 if sub_files:
                                     self.log.info("Detected subtitles: %s", sub_files[0])
                                     subtitles = sub_files[0]
                             else:
-                                file_status = self.engine.file_status(file_id)
+                                file_status = monitor.file_status(file_id)
                                 if not file_status:
                                     continue
                             if status.state == State.DOWNLOADING:
@@ -165,38 +378,54 @@ class Torrent2HttpStream(TorrentStream):
                                                                   status.num_peers)
                 else:
                     while not self._aborted():
-                        sleep(self.SLEEP_DELAY)
-                        status = self.engine.status()
-                        self.engine.check_torrent_error(status)
+                        monitor.wait_startup()
+                        status = monitor.poll(with_files=False)
                         if status.state in [State.DOWNLOADING, State.FINISHED, State.SEEDING]:
                             ready = True
                             break
                 if ready:
+                    self._observe_buffering('torrent2http', time.time() - buffering_start)
                     self.log.info("Starting playback...")
                     with nested(closing(self.playing_progress),
                                 player.attached(player.PLAYBACK_PAUSED, self.playing_progress.open),
-                                player.attached(player.PLAYBACK_RESUMED, self.playing_progress.close)):
+                                player.attached(player.PLAYBACK_PAUSED, monitor.reset),
+                                player.attached(player.PLAYBACK_RESUMED, self.playing_progress.close),
+                                profiling('playback')):
                         list_item.setdefault('label', status.name)
                         file_status = self.engine.file_status(file_id)
+                        file_id = self.playing_file_id = file_status.index
                         list_item['path'] = file_status.url
                         self.playing_progress.name = status.name
                         self.playing_progress.size = file_status.size
                         player.play(list_item, subtitles.url if subtitles else None)
                         start = time.time()
+                        monitor.reset()
                         while not self._aborted() and (player.is_playing()
                                                        or time.time()-start < self.playback_start_timeout):
+                            # nobody sees the status while overlay is hidden, so don't poll the engine at all
+                            if not self.playing_progress.is_visible():
+                                sleep(self.IDLE_SLEEP_DELAY)
+                                player.get_percent()
+                                continue
                             sleep(self.SLEEP_DELAY)
-                            status = self.engine.status()
-                            file_status = self.engine.file_status(file_id)
-                            state = self._convert_state(status.state)
-                            self.playing_progress.update_status(state, file_status.download, status.download_rate,
-                                                                status.upload_rate, status.num_seeds, status.num_peers)
+                            if monitor.poll_due():
+                                status = monitor.poll(file_id)
+                                file_status = monitor.file_status(file_id)
+                                state = self._convert_state(status.state)
+                                self.playing_progress.update_status(state, file_status.download,
+                                                                    status.download_rate, status.upload_rate,
+                                                                    status.num_seeds, status.num_peers)
                             player.get_percent()
 
                         # handling PLAYBACK_STOPPED and PLAYBACK_ENDED events
                         sleep(1000)
+                    status = monitor.poll(file_id)
+                    file_status = monitor.file_status(file_id)
         except Error as err:
             raise self._convert_engine_error(err)
+        self.played_paths = [self._resume_file(torrent)]
+        if file_status:
+            self.played_paths.append(file_status.save_path)
         if status and file_status and status.state in [State.FINISHED, State.SEEDING]:
             files = [file_status.save_path]
             if subtitles and os.path.exists(subtitles.save_path):
@@ -152,6 +152,9 @@ class XbmcTorrentTransferProgress(AbstractTorrentTransferProgress):
     def is_cancelled(self):
         return self.handler.is_cancelled()
 
+    def is_visible(self):
+        return self.handler.opened
+
     def update(self, percent):
         lines = []
         if self.name is not None:
@@ -192,6 +195,9 @@ class XbmcOverlayTorrentTransferProgress(AbstractTorrentTransferProgress):
     def is_cancelled(self):
         return False
 
+    def is_visible(self):
+        return self.overlay.visible
+
     def update(self, percent):
         if not self.overlay.visible:
             return
@@ -22,14 +22,48 @@ class ContextManager(object):
         self.callbacks.detach(self.event, self.callback)
 
 
+def invoker(callback):
+    """
+    Prebind argument adaptation of the callback: returned function of (event, args, kwargs) passes only
+    positional arguments and keywords (including 'event') which the callback accepts
+    """
+    try:
+        argspec = inspect.getargspec(callback)
+    except TypeError:
+        return lambda event, args, kwargs: callback(*args, **kwargs)
+    specargs = argspec.args
+    if getattr(callback, 'im_self', None) is not None:
+        specargs = specargs[1:]
+    count = len(specargs)
+    names = frozenset(specargs)
+    if not count:
+        return lambda event, args, kwargs: callback()
+    takes_event = 'event' in names
+
+    def invoke(event, args, kwargs):
+        if kwargs:
+            kwargs = dict((k, v) for k, v in kwargs.iteritems() if k in names)
+        if takes_event:
+            kwargs = dict(kwargs, event=event)
+        callback(*args[:count], **kwargs)
+    return invoke
+
+
 class Callbacks(object):
     def __init__(self):
         self.callbacks = {}
+        # event -> tuple of (callback, invoker), replaced as a whole on attach/detach
+        self._invokers = {}
         self.log = logging.getLogger(__name__)
 
     def attached(self, event, callback):
         return ContextManager(self, event, callback)
 
+    def _rebind(self, event):
+        bound = dict(self._invokers.get(event, ()))
+        self._invokers[event] = tuple((callback, bound.get(callback) or invoker(callback))
+                                      for callback in self.callbacks.get(event, ()))
+
     def attach(self, event, callback):
         if isinstance(event, list):
             for e in event:
@@ -40,6 +74,7 @@ class Callbacks(object):
                 self.callbacks[event] = []
             if callback not in self.callbacks[event]:
                 self.callbacks[event].append(callback)
+                self._rebind(event)
 
     def detach(self, event=None, callback=None):
         if isinstance(event, list):
@@ -50,28 +85,31 @@ class Callbacks(object):
                            "event '%s'" % event if event else "all events")
             if (event is None or event == "*") and callback is None:
                 self.callbacks = {}
+                self._invokers = {}
             elif event is not None and event != "*" and callback is not None:
                 if event in self.callbacks:
                     self.callbacks[event].remove(callback)
+                    self._rebind(event)
             elif event == "*" or callback is None:
                 for event in self.callbacks:
                     self.callbacks[event].remove(callback)
+                    self._rebind(event)
             else:
                 self.callbacks.pop(event, None)
+                self._invokers.pop(event, None)
 
     def run_callbacks(self, event, *args, **kwargs):
-        if event != "*":
-            self.run_callbacks("*", *args, **kwargs)
+        invokers = self._invokers
+        debug = self.log.isEnabledFor(logging.DEBUG)
+        if debug:
             self.log.debug("Event '%s' occurred.", event)
-        if event in self.callbacks:
-            for callback in self.callbacks[event]:
+        if event != "*" and "*" in invokers:
+            self._run(invokers["*"], "*", args, kwargs, debug)
+        if event in invokers:
+            self._run(invokers[event], event, args, kwargs, debug)
+
+    def _run(self, invokers, event, args, kwargs, debug):
+        for callback, invoke in invokers:
+            if debug:
                 self.log.debug("Running callback %s for event '%s'", callback, event)
-                argspec = inspect.getargspec(callback)
-                specargs = argspec.args
-                if hasattr(callback, 'im_self') and callback.im_self is not None:
-                    specargs = specargs[1:]
-                kwargs['event'] = event
-                kwargs = dict(filter(lambda v: v[0] in specargs, kwargs.iteritems()))
-                if len(args) > len(specargs):
-                    args = args[:len(specargs)]
-                callback(*args, **kwargs)
+            invoke(event, args, kwargs)
@@ -11,17 +11,24 @@ import base64
 import mimetools
 import itertools
 import gzip
+import socket
+import httplib
+import threading
 
 from StringIO import StringIO
 from contextlib import closing
 from progress import LoggingFileTransferProgress
+from metrics import default_registry as metrics
 
 
 class HttpClient:
     USER_AGENT = "Mozilla/5.0 (Windows NT 6.2; Win64; x64; rv:16.0.1) Gecko/20121011 Firefox/16.0.1"
     RECOVERABLE_CODES = [500, 502, 503, 504]
     CONTENT_DISPOSITION_RE = re.compile('attachment;\sfilename="*([^"\s]+)"|\s')
+    CONTENT_RANGE_RE = re.compile('bytes\s+(\d+)-(\d+)/(\d+)')
     DOWNLOAD_BUFFER_SIZE = 1024 * 128
+    DOWNLOAD_PROGRESS_INTERVAL = 0.5
+    PARALLEL_DOWNLOAD_MIN_SIZE = 1024 * 1024 * 4
 
     def __init__(self, log=None, progress=None, cookie_jar=None, **request_params):
         self.log = log or logging.getLogger(__name__)
@@ -39,8 +46,7 @@ class HttpClient:
 
     def fetch(self, request, **request_params):
         if not isinstance(request, HttpRequest):
-            params = self.request_params
-            params.update(request_params)
+            params = dict(self.request_params, **request_params)
             request = HttpRequest(request, **params)
 
         opener = self._build_opener(request)
@@ -56,11 +62,17 @@ class HttpClient:
             except urllib2.HTTPError, e:
                 if e.code in self.RECOVERABLE_CODES and tries > 0:
                     self.log.info("%s, retrying in %d second(s)...", e, request.retry_timeout)
+                    metrics.counter('http_fetch_retries_total', "HTTP fetches retried").inc(code=e.code)
                     time.sleep(request.retry_timeout)
                     continue
+                metrics.counter('http_fetch_errors_total', "HTTP fetches failed").inc(code=e.code)
+                raise
+            except urllib2.URLError:
+                metrics.counter('http_fetch_errors_total', "HTTP fetches failed").inc(code='network')
                 raise
 
         response.time = time.time() - response.time
+        metrics.histogram('http_fetch_seconds', "HTTP fetch time, including retries").observe(response.time)
         self.log.debug("Returned %r", response)
         return response
 
@@ -112,7 +124,7 @@ class HttpClient:
                 req = urllib2.Request(request.url)
 
         req.add_header('User-Agent', request.user_agent or self.USER_AGENT)
-        if request.use_gzip:
+        if request.use_gzip and not request.download_path:
             req.add_header('Accept-encoding', 'gzip')
         if request.headers:
             for key, value in request.headers.iteritems():
@@ -122,6 +134,13 @@ class HttpClient:
             auth_str = ':'.join([request.auth_username, request.auth_password])
             req.add_header('Authorization', 'Basic %s' % base64.encodestring(auth_str).strip())
 
+        offset = 0
+        if request.download_path and request.resume:
+            part_path = os.path.abspath(request.download_path) + '.part'
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if offset:
+                req.add_header('Range', 'bytes=%d-' % offset)
+
         with closing(opener.open(req, timeout=request.timeout)) as conn:
             response.headers = self._headers(conn.info())
 
@@ -129,7 +148,7 @@ class HttpClient:
                 response.redirected_to = conn.geturl()
 
             if request.download_path:
-                self._download(request.download_path, conn, response)
+                self._download(opener, req, request, conn, response)
             else:
                 response.body = conn.read()
                 if 'content-encoding' in response.headers and response.headers['content-encoding'] == 'gzip':
@@ -140,63 +159,177 @@ class HttpClient:
         if isinstance(self.cookie_jar, cookielib.FileCookieJar):
             self.cookie_jar.save()
 
-    def _download(self, download_path, conn, response):
+    def _download(self, opener, req, request, conn, response):
         """
-        :type download_path: str
-        :type conn:
-        :param response:
-        :return:
+        Download response body to request.download_path through a temporary .part file.
+
+        Interrupted download is resumed with HTTP Range request if server supports it (also across calls when
+        request.resume is set), large files are fetched in request.download_connections parallel ranges.
+
+        :type opener: urllib2.OpenerDirector
+        :type req: urllib2.Request
+        :type request: HttpRequest
+        :type response: HttpResponse
         """
-        download_path = os.path.abspath(download_path)
-        fd = open(download_path, 'wb')
+        download_path = os.path.abspath(request.download_path)
+        part_path = download_path + '.part'
+        headers = response.headers
 
-        bs = self.DOWNLOAD_BUFFER_SIZE
         size = -1
-        read = 0
+        offset = 0
         name = None
-        progress = self.progress
-
-        if 'content-length' in response.headers:
-            size = int(response.headers['content-length'])
-        if 'content-disposition' in response.headers:
-            r = self.CONTENT_DISPOSITION_RE.search(response.headers['content-disposition'])
+        if conn.getcode() == 206 and 'content-range' in headers:
+            r = self.CONTENT_RANGE_RE.match(headers['content-range'])
+            if r:
+                offset, size = int(r.group(1)), int(r.group(3))
+        elif 'content-length' in headers:
+            size = int(headers['content-length'])
+        if 'content-disposition' in headers:
+            r = self.CONTENT_DISPOSITION_RE.search(headers['content-disposition'])
             if r:
                 name = urllib.unquote(r.group(1))
         name = name or os.path.basename(download_path)
-        self.log.info("Starting download of '%s' to %s", name, download_path)
+        ranges = headers.get('accept-ranges') == 'bytes' or conn.getcode() == 206
+        self.log.info("Starting download of '%s' to %s%s", name, download_path,
+                      " (resuming from %d byte)" % offset if offset else "")
 
-        aborted = False
-        if progress:
-            with closing(progress):
+        state = _DownloadState(offset)
+        progress = self.progress
+        with closing(progress) if progress else _NullContext():
+            if progress:
                 progress.file_name = name
                 progress.size = size
                 progress.open()
+            if offset == 0 and ranges and request.download_connections > 1 and \
+                    size >= self.PARALLEL_DOWNLOAD_MIN_SIZE:
+                self._download_parallel(opener, req, request, conn, part_path, size, state)
+            else:
+                self._download_serial(opener, req, request, conn, part_path, size, ranges, state)
+            if progress and not state.aborted:
+                progress.update_transferred(state.read)
 
-                while not aborted:
-                    buf = conn.read(bs)
-                    if not len(buf):
-                        break
-                    read += len(buf)
-                    fd.write(buf)
-
-                    progress.update_transferred(read)
-                    if progress.is_cancelled():
-                        aborted = True
-        else:
-            while True:
-                buf = conn.read(bs)
-                if not len(buf):
-                    break
-                read += len(buf)
-                fd.write(buf)
-
-        if aborted:
+        if state.aborted:
             self.log.info("File '%s' transfer aborted!", name)
             response.filename = None
         else:
+            if os.path.exists(download_path):
+                os.remove(download_path)
+            os.rename(part_path, download_path)
             self.log.info("File '%s' successfully downloaded.", name)
             response.filename = download_path
 
+    def _download_serial(self, opener, req, request, conn, part_path, size, ranges, state):
+        fd = open(part_path, 'ab' if state.read else 'wb')
+        tries = request.tries
+        with closing(fd):
+            while True:
+                try:
+                    self._copy(conn, fd, state)
+                    # connection may be closed cleanly before the whole body is sent
+                    if size > 0 and state.read < size and not state.aborted:
+                        raise httplib.IncompleteRead('', size - state.read)
+                    break
+                except (socket.error, httplib.HTTPException), e:
+                    tries -= 1
+                    if not ranges or tries <= 0:
+                        raise urllib2.URLError(e)
+                    self.log.info("Connection dropped (%s), resuming from %d byte...", e, state.read)
+                    conn.close()
+                    conn = self._open_range(opener, req, request, state.read, size - 1 if size > 0 else None)
+            conn.close()
+
+    def _download_parallel(self, opener, req, request, conn, part_path, size, state):
+        connections = request.download_connections
+        chunk = size / connections
+        segments = [(i * chunk, (i + 1) * chunk - 1 if i < connections - 1 else size - 1)
+                    for i in range(connections)]
+        self.log.info("Downloading %d byte(s) in %d parallel range(s)", size, connections)
+        # pre-allocating output file, so each range is written to its own position
+        with open(part_path, 'wb') as fd:
+            fd.truncate(size)
+        threads = []
+        for start, end in segments:
+            thread = threading.Thread(target=self._download_segment,
+                                      args=(opener, req, request, conn if start == 0 else None, part_path,
+                                            start, end, state))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(self.DOWNLOAD_PROGRESS_INTERVAL)
+                self._update_progress(state)
+        if state.error or state.aborted:
+            os.remove(part_path)
+            if state.error:
+                raise urllib2.URLError(state.error)
+
+    def _download_segment(self, opener, req, request, conn, part_path, start, end, state):
+        pos = start
+        tries = request.tries
+        try:
+            with open(part_path, 'r+b') as fd:
+                while pos <= end and not state.aborted:
+                    try:
+                        if conn is None:
+                            conn = self._open_range(opener, req, request, pos, end)
+                        fd.seek(pos)
+                        copied = self._copy(conn, fd, state, end - pos + 1, update_progress=False)
+                        pos += copied
+                        if not copied and not state.aborted:
+                            raise httplib.IncompleteRead('')
+                    except (socket.error, httplib.HTTPException, urllib2.URLError), e:
+                        tries -= 1
+                        if tries <= 0:
+                            raise
+                        pos = fd.tell()
+                        self.log.info("Range %d-%d dropped (%s), resuming from %d byte...", start, end, e, pos)
+                    finally:
+                        if conn is not None:
+                            conn.close()
+                            conn = None
+        except Exception, e:
+            state.error = e
+            state.aborted = True
+
+    def _copy(self, conn, fd, state, limit=None, update_progress=True):
+        copied = 0
+        while not state.aborted and (limit is None or copied < limit):
+            bs = self.DOWNLOAD_BUFFER_SIZE if limit is None else min(self.DOWNLOAD_BUFFER_SIZE, limit - copied)
+            buf = conn.read(bs)
+            if not len(buf):
+                break
+            fd.write(buf)
+            copied += len(buf)
+            state.add(len(buf))
+            if update_progress:
+                self._update_progress(state)
+        return copied
+
+    def _update_progress(self, state):
+        """
+        Report progress not more often than DOWNLOAD_PROGRESS_INTERVAL seconds
+        """
+        progress = self.progress
+        if not progress:
+            return
+        now = time.time()
+        if now - state.reported_at >= self.DOWNLOAD_PROGRESS_INTERVAL:
+            state.reported_at = now
+            progress.update_transferred(state.read)
+            if progress.is_cancelled():
+                state.aborted = True
+
+    @staticmethod
+    def _open_range(opener, req, request, start, end=None):
+        range_req = urllib2.Request(req.get_full_url(), headers=dict(req.header_items()))
+        range_req.add_header('Range', 'bytes=%d-%s' % (start, end if end is not None else ''))
+        conn = opener.open(range_req, timeout=request.timeout)
+        if conn.getcode() != 206:
+            conn.close()
+            raise urllib2.URLError("Server ignored range request")
+        return conn
+
     def _upload(self, upload_files, params):
         res = []
         boundary = mimetools.choose_boundary()
@@ -244,6 +377,27 @@ class HttpClient:
         return headers
 
 
+class _DownloadState(object):
+    def __init__(self, read=0):
+        self.read = read
+        self.reported_at = 0
+        self.aborted = False
+        self.error = None
+        self._lock = threading.Lock()
+
+    def add(self, count):
+        with self._lock:
+            self.read += count
+
+
+class _NullContext(object):
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
+
 class HttpRequest:
     METHOD_GET = "GET"
     METHOD_POST = "POST"
@@ -251,7 +405,7 @@ class HttpRequest:
     def __init__(self, url, method='GET', headers=None, params=None, upload_files=None,
                  download_path=None, auth_username=None, auth_password=None, proxy_protocol=None, proxy_host=None,
                  proxy_port=None, proxy_username=None, proxy_password=None, timeout=None, handle_redirects=True,
-                 user_agent=None, tries=1, retry_timeout=1, use_gzip=True):
+                 user_agent=None, tries=1, retry_timeout=1, use_gzip=True, resume=False, download_connections=1):
 
         self.url = url
         self.method = method
@@ -264,6 +418,8 @@ class HttpRequest:
 
         self.upload_files = upload_files
         self.download_path = download_path
+        self.resume = resume
+        self.download_connections = download_connections
 
         self.auth_username = auth_username
         self.auth_password = auth_password
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import timeit
+import logging
+import __builtin__
+
+
+class ImportTimer:
+    """
+    Measures time spent importing modules while active:
+
+        with ImportTimer(logger=log):
+            import foo
+
+    Only first (actual) imports are measured. Cumulative time includes nested imports, own time doesn't.
+    """
+    def __init__(self, timer=None, logger=None, log_level=logging.INFO, top=25):
+        if timer is None:
+            timer = timeit.default_timer
+        self.timer = timer
+        self.logger = logger
+        self.log_level = log_level
+        self.top = top
+        self.times = {}
+        self._stack = []
+        self._import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=None, level=-1):
+        if name in sys.modules:
+            return self._import(name, globals, locals, fromlist, level)
+        self._stack.append(0)
+        start = self.timer()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            total = self.timer() - start
+            nested = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += total
+            # implicit relative imports ("import titleformat") miss sys.modules check, keep the first import time
+            self.times.setdefault(name, (total, total - nested))
+
+    def __enter__(self):
+        self._import = __builtin__.__import__
+        __builtin__.__import__ = self._timed_import
+        self.start = self.timer()
+        return self
+
+    def __exit__(self, *args):
+        __builtin__.__import__ = self._import
+        self.interval = self.timer() - self.start
+        if self.logger:
+            self.logger.log(self.log_level, self.report())
+
+    def report(self):
+        """
+        Imports sorted by cumulative time, most expensive first
+        """
+        lines = ["Imports taken: %f seconds, %d module(s)" % (self.interval, len(self.times)),
+                 "%10s %10s  %s" % ("cumulative", "own", "module")]
+        for name, (total, own) in sorted(self.times.items(), key=lambda t: -t[1][0])[:self.top]:
+            lines.append("%10.4f %10.4f  %s" % (total, own, name))
+        return "\n".join(lines)
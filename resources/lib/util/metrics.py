@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import BaseHTTPServer
+
+from bisect import bisect_left
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _series_key(labels):
+    return tuple(sorted(labels.iteritems()))
+
+
+class Metric(object):
+    """
+    Base of registry metrics. Every distinct set of labels (keyword arguments of recording methods)
+    is a separate series.
+    """
+    type = None
+
+    def __init__(self, name, help_text, lock):
+        self.name = name
+        self.help_text = help_text
+        self.series = {}
+        self._lock = lock
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'type': self.type,
+                'help': self.help_text,
+                'series': [[dict(key), self._copy(value)] for key, value in self.series.iteritems()],
+            }
+
+    def merge(self, snapshot):
+        with self._lock:
+            for labels, value in snapshot['series']:
+                key = _series_key(labels)
+                self.series[key] = self._merge(self.series.get(key), value)
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    @staticmethod
+    def _merge(value, other):
+        raise NotImplementedError()
+
+    def samples(self, value):
+        """
+        Prometheus samples of series value: list of (suffix, extra labels, value)
+        """
+        return [('', (), value)]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _series_key(labels)
+        with self._lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    @staticmethod
+    def _merge(value, other):
+        return (value or 0) + other
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self.series[_series_key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = _series_key(labels)
+        with self._lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    @staticmethod
+    def _merge(value, other):
+        return other
+
+
+class Histogram(Metric):
+    """
+    Histogram with fixed upper bounds of buckets; series value is {'counts': [...], 'sum': s, 'count': n},
+    where the last count is of observations above the highest bound
+    """
+    type = 'histogram'
+
+    def __init__(self, name, help_text, lock, buckets=DEFAULT_BUCKETS):
+        Metric.__init__(self, name, help_text, lock)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _series_key(labels)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = self._empty()
+            series['counts'][bisect_left(self.buckets, value)] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def _empty(self):
+        return {'counts': [0] * (len(self.buckets) + 1), 'sum': 0, 'count': 0}
+
+    def snapshot(self):
+        res = Metric.snapshot(self)
+        res['buckets'] = list(self.buckets)
+        return res
+
+    def merge(self, snapshot):
+        if tuple(snapshot.get('buckets', ())) != self.buckets:
+            # buckets were changed, old observations can't be redistributed
+            return
+        Metric.merge(self, snapshot)
+
+    @staticmethod
+    def _copy(value):
+        return dict(value, counts=list(value['counts']))
+
+    def _merge(self, value, other):
+        value = value or self._empty()
+        return {
+            'counts': [a + b for a, b in zip(value['counts'], other['counts'])],
+            'sum': value['sum'] + other['sum'],
+            'count': value['count'] + other['count'],
+        }
+
+    def samples(self, value):
+        res = []
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), value['counts']):
+            total += count
+            res.append(('_bucket', (('le', str(bound)),), total))
+        res.append(('_sum', (), value['sum']))
+        res.append(('_count', (), value['count']))
+        return res
+
+
+class MetricsRegistry(object):
+    """
+    In-process registry of counters, gauges and histograms:
+
+        registry.counter('http_fetch_retries_total', "HTTP fetch retries").inc(host=host)
+        registry.histogram('http_fetch_seconds', "HTTP fetch time").observe(response.time)
+
+    Metrics are created on first access by name, later calls return the same metric. Snapshots are plain
+    JSON-serializable dicts, which can be merged into another registry (e.g. one of the service process).
+    """
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self.metrics = {}
+        self._lock = threading.RLock()
+
+    def _metric(self, cls, name, help_text, **kwargs):
+        name = self.prefix + name
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text, self._lock, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError("Metric %s is already registered as %s" % (name, metric.type))
+            return metric
+
+    def counter(self, name, help_text=""):
+        """
+        :rtype : Counter
+        """
+        return self._metric(Counter, name, help_text)
+
+    def gauge(self, name, help_text=""):
+        """
+        :rtype : Gauge
+        """
+        return self._metric(Gauge, name, help_text)
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS):
+        """
+        :rtype : Histogram
+        """
+        return self._metric(Histogram, name, help_text, buckets=buckets)
+
+    def snapshot(self):
+        with self._lock:
+            return dict((name, metric.snapshot()) for name, metric in self.metrics.iteritems() if metric.series)
+
+    def empty(self):
+        with self._lock:
+            return not any(metric.series for metric in self.metrics.itervalues())
+
+    def merge(self, snapshot):
+        """
+        Add counters and histograms of the snapshot to ours, take its gauges
+        """
+        types = dict((cls.type, cls) for cls in (Counter, Gauge, Histogram))
+        with self._lock:
+            for name, data in snapshot.iteritems():
+                cls = types.get(data['type'])
+                if not cls:
+                    continue
+                kwargs = {'buckets': data['buckets']} if cls is Histogram else {}
+                metric = self.metrics.get(name) or self.metrics.setdefault(name, cls(name, data['help'], self._lock,
+                                                                                     **kwargs))
+                if isinstance(metric, cls):
+                    metric.merge(data)
+
+    def reset(self):
+        """
+        Clear all series, return their snapshot
+        """
+        with self._lock:
+            snapshot = self.snapshot()
+            for metric in self.metrics.itervalues():
+                metric.series = {}
+            return snapshot
+
+    def prometheus_text(self):
+        """
+        Metrics in Prometheus text exposition format
+        """
+        lines = []
+        with self._lock:
+            for name in sorted(self.metrics):
+                metric = self.metrics[name]
+                if not metric.series:
+                    continue
+                if metric.help_text:
+                    lines.append("# HELP %s %s" % (name, metric.help_text))
+                lines.append("# TYPE %s %s" % (name, metric.type))
+                for key in sorted(metric.series):
+                    for suffix, extra, value in metric.samples(metric.series[key]):
+                        labels = ','.join('%s="%s"' % (k, _escape(v)) for k, v in key + extra)
+                        lines.append("%s%s%s %s" % (name, suffix, "{%s}" % labels if labels else "", _number(value)))
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return unicode(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').encode('utf-8')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler, object):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.registry.prometheus_text()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MetricsServer(object):
+    """
+    Serves registry metrics over HTTP (/metrics) from a daemon thread
+    """
+    def __init__(self, registry, port, host='127.0.0.1'):
+        handler = type('Handler', (MetricsRequestHandler,), {'registry': registry})
+        self.server = BaseHTTPServer.HTTPServer((host, port), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name='MetricsServer')
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+default_registry = MetricsRegistry(prefix='okino_')
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import thread
+import logging
+import threading
+
+
+class SamplingProfiler(object):
+    """
+    Samples the stack of a thread from a background thread while active and appends counts of sampled stacks
+    to a file in collapsed format (one "root;...;leaf count" line per stack, as read by flamegraph.pl,
+    speedscope etc.):
+
+        with SamplingProfiler("plugin.collapsed"):
+            plugin.run()
+
+    Frames are "function (file:line)", so leaf frames point to hot lines. The file is rotated when it
+    grows over max_size, keeping given number of backups (file.1, file.2, ...).
+    """
+    def __init__(self, path, interval=0.005, max_size=5*1024*1024, backups=2, thread_id=None, log=None):
+        self.path = path
+        self.interval = interval
+        self.max_size = max_size
+        self.backups = backups
+        self.thread_id = thread_id
+        self.log = log or logging.getLogger(__name__)
+        self.counts = {}
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = None
+        self._codes = {}
+
+    def _frame_name(self, frame):
+        code = frame.f_code
+        name = self._codes.get(code)
+        if name is None:
+            path = code.co_filename.replace('\\', '/').split('/')
+            name = "%s (%s:" % (code.co_name, '/'.join(path[-2:]))
+            name = self._codes[code] = name.replace('%', '%%') + "%d)"
+        return name % frame.f_lineno
+
+    def _sample(self, frame):
+        names = []
+        while frame is not None:
+            names.append(self._frame_name(frame))
+            frame = frame.f_back
+        names.reverse()
+        stack = ';'.join(names)
+        self.counts[stack] = self.counts.get(stack, 0) + 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            self._sample(frame)
+
+    def start(self):
+        if self.thread_id is None:
+            self.thread_id = thread.get_ident()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='SamplingProfiler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+        try:
+            self.write()
+        except (IOError, OSError) as e:
+            self.log.warn("Can't write profile to %s: %s", self.path, e)
+
+    def _rotate(self):
+        if self.backups:
+            for i in range(self.backups - 1, 0, -1):
+                src = "%s.%d" % (self.path, i)
+                if os.path.exists(src):
+                    os.rename(src, "%s.%d" % (self.path, i + 1))
+            os.rename(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+
+    def write(self):
+        """
+        Append sampled stacks to the file, rotating it beforehand if it would grow over max_size
+        """
+        if not self.counts:
+            return
+        lines = "".join("%s %d\n" % (stack, count) for stack, count in self.counts.iteritems())
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(lines) > self.max_size:
+            self._rotate()
+        dirname = os.path.dirname(self.path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(self.path, 'a') as f:
+            f.write(lines)
+        self.log.info("Profile of %d sample(s) written to %s", self.samples, self.path)
+        self.counts = {}
+        self.samples = 0
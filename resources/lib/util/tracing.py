@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import thread
+import timeit
+import threading
+
+from util.timer import Timer
+
+
+class Tracer(object):
+    """
+    Records nested spans per thread while started and exports them as Chrome trace events
+    (chrome://tracing, Perfetto):
+
+        tracer = Tracer()
+        tracer.start()
+        with tracer.span("Fetching URL", url=url):
+            ...
+        tracer.stop()
+        tracer.export("trace.json")
+
+    Methods of other modules can be wrapped into spans with instrument() without touching their code.
+    """
+    def __init__(self, timer=None):
+        if timer is None:
+            timer = timeit.default_timer
+        self.timer = timer
+        self.enabled = False
+        self.events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._threads = {}
+        self._patched = []
+        self._origin = timer()
+
+    def start(self):
+        with self._lock:
+            self.events = []
+            self._threads = {}
+        self._origin = self.timer()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    def span(self, name, cat=None, **args):
+        """
+        :rtype : Span
+        """
+        return Span(name=name, tracer=self, cat=cat, args=args)
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current(self):
+        """
+        Innermost open span of the calling thread or None
+        """
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def enter(self, span):
+        self._stack().append(span)
+
+    def leave(self, span):
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+        if not self.enabled:
+            return
+        tid = thread.get_ident()
+        event = {
+            'name': span.name,
+            'cat': span.cat or 'default',
+            'ph': 'X',
+            'ts': (span.start - self._origin) * 1e6,
+            'dur': span.interval * 1e6,
+            'pid': os.getpid(),
+            'tid': tid,
+            'args': dict(span.args, depth=len(stack)),
+        }
+        with self._lock:
+            self.events.append(event)
+            if tid not in self._threads:
+                self._threads[tid] = threading.current_thread().name
+
+    def instrument(self, owner, name, span_name=None, cat=None):
+        """
+        Replace method (or function) name of owner with a wrapper recording a span of each call
+        """
+        original = owner.__dict__[name] if isinstance(owner, type) else getattr(owner, name)
+        func = original.__func__ if isinstance(original, (staticmethod, classmethod)) else original
+        span_name = span_name or func.__name__
+        tracer = self
+
+        def traced(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with Span(name=span_name, tracer=tracer, cat=cat):
+                return func(*args, **kwargs)
+        traced.__name__ = func.__name__
+        traced.__doc__ = func.__doc__
+        if isinstance(original, (staticmethod, classmethod)):
+            traced = type(original)(traced)
+        setattr(owner, name, traced)
+        self._patched.append((owner, name, original))
+
+    def uninstrument(self):
+        for owner, name, original in reversed(self._patched):
+            setattr(owner, name, original)
+        self._patched = []
+
+    def trace_events(self):
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self._threads)
+        pid = os.getpid()
+        for tid, thread_name in threads.iteritems():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread_name}})
+        return events
+
+    def export(self, path):
+        """
+        Write recorded spans to path in Chrome trace event format
+        """
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'}, f)
+
+
+class Span(Timer):
+    """
+    Timer, which is also recorded as a span by the tracer when it's started
+    """
+    def __init__(self, name="Total time", tracer=None, cat=None, args=None, **kwargs):
+        self.tracer = tracer or default_tracer
+        kwargs.setdefault('timer', self.tracer.timer)
+        Timer.__init__(self, name=name, **kwargs)
+        self.cat = cat
+        self.args = args or {}
+
+    def __enter__(self):
+        self.tracer.enter(self)
+        return Timer.__enter__(self)
+
+    def __exit__(self, *args):
+        Timer.__exit__(self, *args)
+        self.tracer.leave(self)
+
+
+default_tracer = Tracer()
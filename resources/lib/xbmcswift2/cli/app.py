@@ -17,18 +17,23 @@ from xbmcswift2 import Plugin, ListItem, logger
 from xbmcswift2.common import Modes
 from xbmcswift2.cli import Option
 from xbmcswift2.cli.console import display_listitems, continue_or_quit, get_user_choice
+from xbmcswift2.cli.bench import bench_mode
 
 
 class RunCommand(object):
     """A CLI command to run a plugin."""
 
     command = 'run'
-    usage = '%prog run [once|interactive|crawl] [url]'
+    usage = '%prog run [once|interactive|crawl] [url] | run bench <script.json>'
     option_list = (
         Option('-q', '--quiet', action='store_true',
                help='set logging level to quiet'),
         Option('-v', '--verbose', action='store_true',
                help='set logging level to verbose'),
+        Option('-n', '--rounds', type='int',
+               help='bench mode: number of runs of every url'),
+        Option('--cold', action='store_true',
+               help='bench mode: remove storages before every run'),
     )
 
     @staticmethod
@@ -49,6 +54,9 @@ class RunCommand(object):
             url = args.pop(0)
 
         plugin_mgr = PluginManager.load_plugin_from_addonxml(mode, url)
+        if mode == Modes.BENCH:
+            # url is the bench script here
+            return bench_mode(plugin_mgr.plugin, url, opts.rounds, opts.cold)
         plugin_mgr.run()
 
 
@@ -0,0 +1,197 @@
+"""
+    xbmcswift2.cli.bench
+    --------------------
+
+    This module contains the 'bench' run mode: runs a scripted set of plugin
+    URLs repeatedly and reports route latencies broken down into phases.
+
+    A bench script is a JSON file::
+
+        {
+            "urls": ["plugin://plugin.id/", "plugin://plugin.id/explore/MOVIES"],
+            "rounds": 10,
+            "setup": "package.module:function",
+            "reset": "package.module:function",
+            "phases": {
+                "fetch": ["package.module:Class.method"],
+                "parse": ["package.module:Class.method", "package.module:function"]
+            }
+        }
+
+    "setup" (optional) is called with the directory of the script before the
+    runs, e.g. to start a local fixture HTTP server. "reset" (optional) is
+    called before every cold run, after storages are removed, to drop caches
+    the plugin keeps in memory between runs. Phases are measured by
+    wrapping the given functions; time of nested phases is excluded, so each
+    phase gets only its own time (summed over threads). Besides the scripted
+    phases, 'storage', 'itemify' and 'addDirectoryItems' are always measured.
+"""
+import os
+import sys
+import json
+import shutil
+import threading
+import timeit
+
+
+DEFAULT_PHASES = {
+    'storage': ['xbmcswift2.storage:Storage._execute'],
+    'itemify': ['xbmcswift2.xbmcmixin:XBMCMixin._listitemify', 'xbmcswift2.listitem:ListItem.tuple_from_dict'],
+    'addDirectoryItems': ['xbmcswift2.xbmcmixin:xbmcplugin.addDirectoryItems'],
+}
+
+
+def resolve(spec):
+    """Returns (owner, attribute name) for a 'module:attr.path' spec."""
+    module_name, path = spec.split(':')
+    __import__(module_name)
+    owner = sys.modules[module_name]
+    names = path.split('.')
+    for name in names[:-1]:
+        owner = getattr(owner, name)
+    return owner, names[-1]
+
+
+class PhaseProbes(object):
+    """Wraps functions to accumulate their own (exclusive) time per phase."""
+
+    def __init__(self, phases, timer=timeit.default_timer):
+        self.phases = phases
+        self.timer = timer
+        self.times = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._patched = []
+
+    def _wrap(self, phase, func):
+        probes = self
+
+        def probe(*args, **kwargs):
+            stack = probes._local.__dict__.setdefault('stack', [])
+            stack.append(0.0)
+            start = probes.timer()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = probes.timer() - start
+                nested = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with probes._lock:
+                    probes.times[phase] = probes.times.get(phase, 0.0) + elapsed - nested
+        probe.__name__ = func.__name__
+        probe.__doc__ = func.__doc__
+        return probe
+
+    def install(self):
+        for phase, specs in self.phases.items():
+            for spec in specs:
+                owner, name = resolve(spec)
+                original = owner.__dict__[name] if isinstance(owner, type) else getattr(owner, name)
+                if isinstance(original, (staticmethod, classmethod)):
+                    wrapped = type(original)(self._wrap(phase, original.__func__))
+                else:
+                    wrapped = self._wrap(phase, original)
+                setattr(owner, name, wrapped)
+                self._patched.append((owner, name, original))
+
+    def uninstall(self):
+        for owner, name, original in reversed(self._patched):
+            setattr(owner, name, original)
+        self._patched = []
+
+    def reset(self):
+        with self._lock:
+            times, self.times = self.times, {}
+        return times
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * p / 100.0
+    f = int(k)
+    c = min(f + 1, len(values) - 1)
+    return values[f] + (values[c] - values[f]) * (k - f)
+
+
+def clear_storages(plugin):
+    """Removes all plugin storages, so the next run starts with cold caches."""
+    plugin.close_storages()
+    shutil.rmtree(plugin.storage_path, True)
+    os.makedirs(plugin.storage_path)
+
+
+def run_url(plugin, url, probes):
+    from xbmcswift2.cli.app import patch_plugin
+    patch_plugin(plugin, url, 0)
+    plugin.clear_added_items()
+    start = timeit.default_timer()
+    plugin.run()
+    total = timeit.default_timer() - start
+    return total, probes.reset()
+
+
+def bench(plugin, script_path, rounds=None, cold=False):
+    """Runs the bench script, returns {url: [(total, {phase: seconds}), ...]}"""
+    with open(script_path) as f:
+        script = json.load(f)
+    rounds = rounds or script.get('rounds', 5)
+    if script.get('setup'):
+        owner, name = resolve(script['setup'])
+        getattr(owner, name)(os.path.dirname(os.path.abspath(script_path)))
+
+    reset = None
+    if script.get('reset'):
+        owner, name = resolve(script['reset'])
+        reset = getattr(owner, name)
+
+    phases = dict(DEFAULT_PHASES)
+    phases.update(script.get('phases', {}))
+    probes = PhaseProbes(phases)
+    probes.install()
+    results = dict((url, []) for url in script['urls'])
+    # measure the way items are added in XBMC
+    plugin.retain_added_items = False
+    try:
+        if not cold:
+            # prime caches and imports
+            for url in script['urls']:
+                run_url(plugin, url, probes)
+        for _ in range(rounds):
+            for url in script['urls']:
+                if cold:
+                    clear_storages(plugin)
+                    if reset:
+                        reset()
+                results[url].append(run_url(plugin, url, probes))
+    finally:
+        probes.uninstall()
+        del plugin.retain_added_items
+    return script['urls'], sorted(phases), results
+
+
+def report(urls, phases, results, cold=False):
+    lines = ['Route latency, ms (%s cache)' % ('cold' if cold else 'warm')]
+    header = '%-50s %8s %8s' % ('url', 'p50', 'p95')
+    for phase in phases:
+        header += ' %18s' % (phase + ' p50')
+    lines.append(header)
+    for url in urls:
+        runs = results[url]
+        line = '%-50s %8.1f %8.1f' % (url[-50:], percentile([t for t, _ in runs], 50) * 1000,
+                                      percentile([t for t, _ in runs], 95) * 1000)
+        for phase in phases:
+            line += ' %18.1f' % (percentile([p.get(phase, 0.0) for _, p in runs], 50) * 1000)
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def bench_mode(plugin, script_path, rounds=None, cold=False):
+    """A run mode for the CLI that benchmarks the routes of a bench script."""
+    if not script_path:
+        sys.exit('bench mode requires a bench script: run bench <script.json>')
+    urls, phases, results = bench(plugin, script_path, rounds, cold)
+    print report(urls, phases, results, cold)
+    return results
@@ -9,6 +9,7 @@
 """
 import sys
 import urllib
+import datetime
 import urllib2
 try:
     # noinspection PyPep8Naming
@@ -46,9 +47,9 @@ def enum(*args, **kwargs):
     return type('Enum', (), kwargs)
 
 
-Modes = enum('XBMC', 'ONCE', 'CRAWL', 'INTERACTIVE')
+Modes = enum('XBMC', 'ONCE', 'CRAWL', 'INTERACTIVE', 'BENCH')
 # noinspection PyUnresolvedReferences
-DEBUG_MODES = [Modes.ONCE, Modes.CRAWL, Modes.INTERACTIVE]
+DEBUG_MODES = [Modes.ONCE, Modes.CRAWL, Modes.INTERACTIVE, Modes.BENCH]
 
 
 def clean_dict(dct):
@@ -56,6 +57,47 @@ def clean_dict(dct):
     return dict((key, val) for key, val in dct.items() if val is not None)
 
 
+def _encode_date(val):
+    return "cdatetime\ndate\n(S%s\ntR." % repr(val.__reduce__()[1][0])
+
+
+# Typed encoders producing protocol 0 pickles without running pickler. Numbers
+# and None are encoded exactly as pickle.dumps does, dates are encoded without
+# memo opcodes (so their pickles differ from pickle.dumps output), but all of
+# them are decoded by unpickle_args/unpickle_dict as before.
+ARG_ENCODERS = {
+    int: lambda val: 'I%d\n.' % val,
+    long: lambda val: 'L%dL\n.' % val,
+    bool: lambda val: 'I0%d\n.' % val,
+    type(None): lambda val: 'N.',
+    datetime.date: _encode_date,
+}
+
+ENCODED_ARGS_LIMIT = 256
+
+_encoded_args = {}
+
+
+def encode_arg(val):
+    """Returns pickled val, using typed encoder if there is one for its type
+    and memoizing pickles of other hashable values (e.g. enums). Memo is keyed
+    by type as well, since equal values of different types pickle differently,
+    and stops growing after ENCODED_ARGS_LIMIT entries."""
+    encoder = ARG_ENCODERS.get(type(val))
+    if encoder:
+        return encoder(val)
+    key = (type(val), val)
+    try:
+        return _encoded_args[key]
+    except KeyError:
+        res = pickle.dumps(val)
+        if len(_encoded_args) < ENCODED_ARGS_LIMIT:
+            _encoded_args[key] = res
+        return res
+    except TypeError:
+        return pickle.dumps(val)
+
+
 def pickle_args(items):
     ret = {}
     pickled_keys = []
@@ -74,7 +116,7 @@ def pickle_args(items):
                 else:
                     if key not in pickled_keys:
                         pickled_keys.append(key)
-                    res.append(pickle.dumps(v))
+                    res.append(encode_arg(v))
             ret[key] = res
     if pickled_keys:
         ret['_pickled'] = ','.join(pickled_keys)
@@ -224,3 +224,48 @@ class ListItem(object):
             listitem.add_context_menu_items(context_menu, replace_context_menu)
 
         return listitem
+
+    @staticmethod
+    def tuple_from_dict(label=None, label2=None, icon=None, thumbnail=None,
+                        path=None, selected=None, info=None, properties=None,
+                        context_menu=None, replace_context_menu=False,
+                        is_playable=None, info_type='video', stream_info=None):
+        """Same as :meth:`from_dict` followed by :meth:`as_tuple`, but
+        builds the xbmcgui.ListItem directly in one pass, without the
+        wrapper. Used when added items aren't kept.
+
+        :returns: a tuple (path, xbmcgui.ListItem, is_folder)
+        """
+        kwargs = {}
+        if label is not None:
+            kwargs['label'] = label
+        if label2 is not None:
+            kwargs['label2'] = label2
+        if icon is not None:
+            kwargs['iconImage'] = icon
+        if thumbnail is not None:
+            kwargs['thumbnailImage'] = thumbnail
+        if path is not None:
+            kwargs['path'] = path
+        listitem = xbmcgui.ListItem(**kwargs)
+
+        if selected is not None:
+            listitem.select(selected)
+        if info:
+            listitem.setInfo(info_type, info)
+        if is_playable:
+            listitem.setProperty('isPlayable', 'true')
+        if properties:
+            if hasattr(properties, 'items'):
+                properties = properties.items()
+            for key, val in properties:
+                listitem.setProperty(key, val)
+        if stream_info:
+            if isinstance(stream_info, dict):
+                stream_info = stream_info.items()
+            for stream_type, stream_values in stream_info:
+                listitem.addStreamInfo(stream_type, stream_values)
+        if context_menu:
+            listitem.addContextMenuItems(context_menu, replace_context_menu)
+
+        return path, listitem, not is_playable
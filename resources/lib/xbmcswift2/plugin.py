@@ -18,7 +18,7 @@ except ImportError:
     from cgi import parse_qs
 
 from logger import log, setup_log
-from urls import UrlRule, NotFoundException, AmbiguousUrlException
+from urls import UrlRule, UrlRuleIndex, NotFoundException, AmbiguousUrlException
 from xbmcswift2 import xbmc, xbmcaddon, Request, xbmcvfs
 from xbmcmixin import XBMCMixin
 
@@ -55,11 +55,19 @@ class Plugin(XBMCMixin):
                      addon directoy anyway. The parameter still exists to ease
                      testing.
     """
+    # memoize url_for results within a single request
+    memoize_urls = True
 
     def __init__(self, name=None, addon_id=None, filepath=None, info_type=None):
         self._name = name
         self._routes = []
         self._view_functions = {}
+        # dispatch table of self._routes and reverse index of view function -> rule for url_for
+        self._route_index = UrlRuleIndex()
+        self._view_rules = {}
+        # first path segment -> names of not yet imported modules with views
+        self._lazy_modules = {}
+        self._lazy_module_names = []
 
         # addon_id is no longer required as it can be parsed from addon.xml
         if addon_id:
@@ -85,6 +93,9 @@ class Plugin(XBMCMixin):
         # Gets initialized when self.run() is called
         self._request = None
 
+        # URLs built by url_for during the current request
+        self._url_memo = {}
+
         # A flag to keep track of a call to xbmcplugin.endOfDirectory()
         self._end_of_directory = False
 
@@ -262,7 +273,47 @@ class Plugin(XBMCMixin):
             log.debug('Adding url rule "%s" named "%s" pointing to function '
                       '"%s"', url_rule, name, view_func.__name__)
             self._view_functions[name] = rule
+        self._view_rules.setdefault(view_func, rule)
         self._routes.append(rule)
+        self._route_index.add(rule)
+
+    def add_lazy_module(self, module_name, prefixes):
+        """Registers a module with view functions to be imported only when
+        a path with one of the given first segments (e.g. 'search' for
+        '/search/<section>', '' for '/') is dispatched, or when url_for
+        can't find an endpoint among the already registered views (then
+        modules are imported one by one in the order of registration).
+        """
+        for prefix in prefixes:
+            self._lazy_modules.setdefault(prefix, []).append(module_name)
+        if module_name not in self._lazy_module_names:
+            self._lazy_module_names.append(module_name)
+
+    def _load_lazy_modules(self, prefix=None):
+        """Imports lazy modules registered for the prefix (or all of them if
+        prefix is None). Returns True if any module was imported."""
+        if prefix is None:
+            names = [name for names in self._lazy_modules.values() for name in names]
+            self._lazy_modules.clear()
+        else:
+            names = self._lazy_modules.pop(prefix, [])
+        imported = False
+        for name in names:
+            if name not in sys.modules:
+                log.debug('Importing views module "%s"', name)
+                __import__(name)
+                imported = True
+        return imported
+
+    def _load_next_lazy_module(self):
+        """Imports the first registered lazy module which isn't imported yet.
+        Returns False if all of them are imported."""
+        for name in self._lazy_module_names:
+            if name not in sys.modules:
+                log.debug('Importing views module "%s"', name)
+                __import__(name)
+                return True
+        return False
 
     def url_for(self, endpoint, **items):
         """Returns a valid XBMC plugin URL for the given endpoint name.
@@ -272,13 +323,27 @@ class Plugin(XBMCMixin):
 
         Raises AmbiguousUrlException if there is more than one possible
         view for the given endpoint name.
+
+        Identical calls are memoized for the current request if
+        memoize_urls is set.
         """
+        memo_key = None
+        if self.memoize_urls:
+            try:
+                memo_key = (endpoint, frozenset((key, type(val), val) for key, val in items.iteritems()))
+                return self._url_memo[memo_key]
+            except KeyError:
+                pass
+            except TypeError:
+                memo_key = None
         try:
             rule = self._view_functions[endpoint]
         except KeyError:
             try:
-                rule = (rule for rule in self._view_functions.values() if rule.view_func == endpoint).next()
-            except StopIteration:
+                rule = self._view_rules[endpoint]
+            except (KeyError, TypeError):
+                if self._load_next_lazy_module():
+                    return self.url_for(endpoint, **items)
                 raise NotFoundException(
                     '%s doesn\'t match any known patterns.' % endpoint)
 
@@ -290,14 +355,18 @@ class Plugin(XBMCMixin):
             raise AmbiguousUrlException
 
         pathqs = rule.make_path_qs(items)
-        return 'plugin://%s%s' % (self._addon_id, pathqs)
+        url = 'plugin://%s%s' % (self._addon_id, pathqs)
+        if memo_key is not None:
+            self._url_memo[memo_key] = url
+        return url
 
     def _dispatch(self, path):
-        for rule in self._routes:
-            try:
-                view_func, items = rule.match(path)
-            except NotFoundException:
-                continue
+        self._load_lazy_modules(UrlRuleIndex.segment(path))
+        rule = self._route_index.find(path)
+        if not rule and self._load_lazy_modules():
+            rule = self._route_index.find(path)
+        if rule:
+            view_func, items = rule.match(path)
             log.info('Request for "%s" matches rule for function "%s"',
                      path, view_func.__name__)
             listitems = view_func(**items)
@@ -318,6 +387,7 @@ class Plugin(XBMCMixin):
         have the final plugin:// url."""
         # TODO: Should we be overriding self.request with the new request?
         self._request = self._parse_request(url=url, handle=self.request.handle)
+        self._url_memo.clear()
         log.debug('Redirecting %s to %s', self.request.path, self._request.path)
         return self._dispatch(self._request.path)
 
@@ -337,6 +407,8 @@ class Plugin(XBMCMixin):
     def run(self):
         """The main entry point for a plugin."""
         self._request = self._parse_request()
+        self._url_memo.clear()
+        self.snapshot_settings()
         log.debug('Handling incoming request for %s', self.request.path)
         items = self._dispatch(self.request.path)
         self.close_storages()
@@ -46,8 +46,15 @@ class UrlRule(object):
         self._options = options or {}
         self._keywords = re.findall(r'<(.+?)>', url_rule)
 
+        self._keyword_set = frozenset(self._keywords)
+        # defaults from options going to the path, computed once per rule
+        self._path_defaults = dict((key, val) for key, val in self._options.items()
+                                   if key in self._keyword_set)
+
         # change <> to {} for use with str.format()
         self._url_format = self._url_rule.replace('<', '{').replace('>', '}')
+        # precompiled %-template used to build paths
+        self._path_template = re.sub(r'<(.+?)>', r'%(\1)s', self._url_rule.replace('%', '%%'))
 
         # Make a regex pattern for matching incoming URLs
         rule = self._url_rule
@@ -117,15 +124,7 @@ class UrlRule(object):
                 raise TypeError('Value "%s" for key "%s" must be an instance'
                                 ' of basestring' % (val, key))
             items[key] = quote_plus(val)
-
-        try:
-            path = self._url_format.format(**items)
-        except AttributeError:
-            # Old version of python
-            path = self._url_format
-            for key, val in items.items():
-                path = path.replace('{%s}' % key, val)
-        return path
+        return self._path_template % items
 
     @staticmethod
     def _make_qs(items):
@@ -153,31 +152,33 @@ class UrlRule(object):
                      hard limit on URL length. See the caching section if you
                      need to persist a large amount of data between requests.
         """
-        # Convert any ints and longs to strings
-        for key, val in items.items():
+        path_items = dict(self._path_defaults)
+        qs_items = {}
+        for key, val in items.iteritems():
+            # Convert any ints and longs to strings
             if isinstance(val, (int, long)):
-                items[key] = str(val)
-
-        # First use our defaults passed when registering the rule
-        url_items = dict((key, val) for key, val in self._options.items()
-                         if key in self._keywords)
-
-        # Now update with any items explicitly passed to url_for
-        url_items.update((key, val) for key, val in items.items()
-                         if key in self._keywords)
+                val = str(val)
+            if key in self._keyword_set:
+                path_items[key] = val
+            else:
+                qs_items[key] = val
 
         # Create the path
-        path = self._make_path(url_items)
+        path = self._make_path(path_items)
 
         # Extra arguments get tacked on to the query string
-        qs_items = dict((key, val) for key, val in items.items()
-                        if key not in self._keywords)
-        qs = self._make_qs(qs_items)
-
-        if qs:
-            return '?'.join([path, qs])
+        if qs_items:
+            qs = self._make_qs(qs_items)
+            if qs:
+                return '?'.join([path, qs])
         return path
 
+    @property
+    def static_prefix(self):
+        """The first path segment of the url rule, or None if it is dynamic."""
+        segment = self._url_rule.lstrip('/').split('/', 1)[0]
+        return None if '<' in segment else segment
+
     @property
     def regex(self):
         """The regex for matching paths against this url rule."""
@@ -202,3 +203,46 @@ class UrlRule(object):
     def keywords(self):
         """The list of path keywords for this url rule."""
         return self._keywords
+
+
+class UrlRuleIndex(object):
+    """Dispatch table of url rules keyed on the first (static) path segment.
+
+    Rules sharing the same segment are matched with a single combined regex
+    preserving their registration order, so finding the rule for a path costs
+    one dict lookup and one regex search instead of trying every rule in turn.
+    Rules starting with a dynamic segment are tried for every path.
+    """
+
+    def __init__(self):
+        self._rules = []
+        self._buckets = {}
+
+    def add(self, rule):
+        self._rules.append(rule)
+        self._buckets.clear()
+
+    @staticmethod
+    def segment(path):
+        """Returns the first segment of the path, the key of the table."""
+        return path.lstrip('/').split('/', 1)[0]
+
+    def _bucket(self, segment):
+        try:
+            return self._buckets[segment]
+        except KeyError:
+            rules = [rule for rule in self._rules
+                     if rule.static_prefix in (segment, None)]
+            patterns = ['(?P<_r%d>%s)' % (i, re.sub(r'\(\?P<.+?>', '(?:', rule.regex.pattern))
+                        for i, rule in enumerate(rules)]
+            regex = re.compile('|'.join(patterns)) if patterns else None
+            bucket = self._buckets[segment] = (regex, rules)
+            return bucket
+
+    def find(self, path):
+        """Returns the first registered rule matching the path, or None."""
+        regex, rules = self._bucket(self.segment(path))
+        m = regex and regex.search(path)
+        if not m:
+            return None
+        return rules[int(m.lastgroup[2:])]
@@ -42,6 +42,15 @@ class XBMCMixin(object):
 
     _function_cache_name = '.functions'
 
+    # raw setting values read during the current invocation, see snapshot_settings()
+    _settings_snapshot = None
+
+    # Keep ListItems passed to add_items() in added_items and return them from
+    # finish(). Only the CLI (and tests) need them, in XBMC items are built
+    # directly and streamed to addDirectoryItems in chunks.
+    retain_added_items = xbmcswift2.CLI_MODE
+    add_items_chunk_size = 100
+
     def cached(self, ttl=60 * 24):
         """A decorator that will cache the output of the wrapped function. The
         key used for the cache is the function name as well as the `*args` and
@@ -183,7 +192,14 @@ class XBMCMixin(object):
         """
         # TODO: allow pickling of settings items?
         # TODO: STUB THIS OUT ON CLI
-        value = self.addon.getSetting(id=key)
+        snapshot = self._settings_snapshot
+        if snapshot is None:
+            value = self.addon.getSetting(id=key)
+        else:
+            try:
+                value = snapshot[key]
+            except KeyError:
+                value = snapshot[key] = self.addon.getSetting(id=key)
         if converter is str:
             return value
         elif converter is unicode:
@@ -205,11 +221,33 @@ class XBMCMixin(object):
 
     def set_setting(self, key, val):
         # TODO: STUB THIS OUT ON CLI
-        return self.addon.setSetting(id=key, value=val)
+        res = self.addon.setSetting(id=key, value=val)
+        if self._settings_snapshot is not None:
+            # new snapshot object, so values derived from the old one get recomputed
+            snapshot = dict(self._settings_snapshot)
+            snapshot.pop(key, None)
+            self._settings_snapshot = snapshot
+        return res
 
     def open_settings(self):
         """Opens the settings dialog within XBMC"""
         self.addon.openSettings()
+        if self._settings_snapshot is not None:
+            self._settings_snapshot = {}
+
+    def snapshot_settings(self):
+        """Starts a new settings snapshot: from now on each setting is read
+        from XBMC only once, until set_setting or open_settings invalidates it.
+        Long running scripts (services) should not use it, as settings may be
+        changed by another process.
+        """
+        self._settings_snapshot = {}
+
+    @property
+    def settings_snapshot(self):
+        """Current settings snapshot (a new object after each invalidation),
+        or None if settings are read from XBMC on every call"""
+        return self._settings_snapshot
 
     @staticmethod
     def add_to_playlist(items, playlist='video'):
@@ -418,7 +456,14 @@ class XBMCMixin(object):
                       dictionary with keys/values suitable for passing to
                       :meth:`xbmcswift2.ListItem.from_dict` or an instance of
                       :class:`xbmcswift2.ListItem`.
+
+        .. note:: Unless :attr:`retain_added_items` is set, items are passed
+                  to XBMC in chunks as they are built and an empty list is
+                  returned.
         """
+        if not self.retain_added_items:
+            return self._stream_items(items, total_items)
+
         _items = [self._listitemify(item) for item in items]
         tuples = [item.as_tuple() for item in _items]
         xbmcplugin.addDirectoryItems(self.handle, tuples, total_items or len(tuples))
@@ -426,12 +471,31 @@ class XBMCMixin(object):
         # We need to keep track internally of added items so we can return them
         # all at the end for testing purposes
         self.added_items.extend(_items)
-
-        # Possibly need an if statement if only for debug mode
         return _items
 
+    def _stream_items(self, items, total_items=None):
+        info_type = self.info_type if hasattr(self, 'info_type') else 'video'
+        if total_items is None and hasattr(items, '__len__'):
+            total_items = len(items)
+        chunk_size = self.add_items_chunk_size
+        tuples = []
+        for item in items:
+            if hasattr(item, 'as_tuple'):
+                tuples.append(item.as_tuple())
+            elif 'info_type' in item:
+                tuples.append(xbmcswift2.ListItem.tuple_from_dict(**item))
+            else:
+                tuples.append(xbmcswift2.ListItem.tuple_from_dict(info_type=info_type, **item))
+            if len(tuples) >= chunk_size:
+                xbmcplugin.addDirectoryItems(self.handle, tuples, total_items or 0)
+                tuples = []
+        if tuples:
+            xbmcplugin.addDirectoryItems(self.handle, tuples, total_items or 0)
+        return []
+
     def add_item(self, item, total_items=None):
-        return self.add_items([item], total_items)[0]
+        items = self.add_items([item], total_items)
+        return items[0] if items else None
 
     def end_of_directory(self, succeeded=True, update_listing=False,
                          cache_to_disc=True):
@@ -502,7 +566,8 @@ class XBMCMixin(object):
         :param view_mode: can either be an integer (or parseable integer
             string) corresponding to a view_mode or the name of a type of view.
             Currrently the only view type supported is 'thumbnail'.
-        :returns: a list of all ListItems added to the XBMC interface.
+        :returns: a list of all ListItems added to the XBMC interface (empty
+                  unless :attr:`retain_added_items` is set).
         """
         # If we have any items, add them. Items are optional here.
         if items:
@@ -11,20 +11,65 @@ from okino.library import update_library
 from okino.plugin import plugin
 from xbmcswift2 import xbmc
 import okino.plugin.main
+import okino.container as container
 
 
-def safe_update():
+def safe_update(medias=None):
     try:
-        update_library()
+        update_library(medias)
         plugin.close_storages()
     except Exception as e:
         plugin.log.exception(e)
 
+
+def safe_save_metrics(metrics_store):
+    if not container.metrics_enabled():
+        return
+    try:
+        metrics_store.collect()
+        if plugin.get_setting('metrics-save', bool):
+            metrics_store.save()
+        metrics_store.storage.close()
+    except Exception as e:
+        plugin.log.exception(e)
+
+
+def start_metrics_server():
+    port = plugin.get_setting('metrics-port', int)
+    if not port:
+        return None
+    from util.metrics import MetricsServer, default_registry
+    try:
+        server = MetricsServer(default_registry, port).start()
+        plugin.log.info("Serving metrics at http://127.0.0.1:%d/metrics" % port)
+        return server
+    except Exception as e:
+        plugin.log.exception(e)
+
+
+def safe_poll():
+    try:
+        library_manager = container.library_manager()
+        if not library_manager.has_folders():
+            return
+        medias = container.library_change_feed().poll()
+        safe_update(medias)
+    except Exception as e:
+        plugin.log.exception(e)
+
 if __name__ == '__main__':
+    metrics_store = container.metrics_store()
+    try:
+        if plugin.get_setting('metrics-save', bool):
+            metrics_store.load()
+    except Exception as e:
+        plugin.log.exception(e)
+    metrics_server = start_metrics_server()
     sleep(5000)
     safe_update()
-    next_run = None
+    next_run = next_poll = None
     while not abort_requested():
+        safe_save_metrics(metrics_store)
         now = datetime.datetime.now()
         if not next_run:
             next_run = now
@@ -34,4 +79,13 @@ if __name__ == '__main__':
             if not xbmc.Player().isPlaying():
                 safe_update()
                 next_run = None
+        if not next_poll:
+            next_poll = now + datetime.timedelta(minutes=plugin.get_setting('library-poll-interval', int))
+        elif now > next_poll:
+            if not xbmc.Player().isPlaying():
+                safe_poll()
+                next_poll = None
         sleep(1000*60)
+    safe_save_metrics(metrics_store)
+    if metrics_server:
+        metrics_server.stop()